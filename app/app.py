@@ -1,33 +1,293 @@
 import os
+import time
 
+import catalog
+import follow
 import numpy as np
+import scheduler
+import serving
+from asr import MODEL_SIZE as ASR_MODEL
 from asr import transcribe_to_segments
-from fastapi import FastAPI, Form, HTTPException
+from batcher import MicroBatcher
+from fastapi import FastAPI, Form, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
+from frame_store import POOLINGS
+from frame_store import frames as frame_store
+from frame_store import pooled_scores
+from id_ranges import (
+    KINDS,
+    RANGES_PATH,
+    add_range,
+    all_ranges,
+    get_ranges,
+    rebuild_from_meta,
+    restore,
+    retire,
+    retired_ids,
+    select_ids,
+    video_ids,
+)
+from index import INDEX_PATH as IMG_INDEX_PATH
 from index import add_vectors as add_img_vectors
+from index import add_vectors_dedup as add_img_vectors_dedup
 from index import load_index as load_img_index
 from index import save_index as save_img_index
 from index import search_vector as search_img
-from models import embed_images, embed_text
+from index import search_vectors as search_img_batch
+from media import make_thumbnails
+from media import serve as serve_media
+from metrics import INGEST, SEARCH, Timings
+from metrics import render as render_metrics
+from models import IMG_MODEL, TEXT_MODEL, embed_images, embed_text
 from PIL import Image
-from store import append, load_all
+from rerank import CANDIDATES as RERANK_CANDIDATES
+from rerank import rerank_shots, rerank_subs
+from scenes_index import INDEX_PATH as SCENES_INDEX_PATH
+from scenes_index import TOP_VIDEOS as SCENE_TOP_VIDEOS
+from scenes_index import build as build_scenes
+from scenes_index import load_index as load_scenes_index
+from scenes_index import load_meta_all as load_scenes_meta
+from scenes_index import load_video_meta_all as load_video_meta
+from scenes_index import save_index as save_scenes_index
+from scenes_index import search_vector as search_scenes
+from scenes_index import search_videos
+from store import append, append_duplicate, load_all, load_duplicates
 
 # subtitles FAISS + ASR
+from subs_index import INDEX_PATH as SUBS_INDEX_PATH
 from subs_index import add_segments as add_subs_segments
 from subs_index import load_index as load_subs_index
 from subs_index import load_meta_all as load_subs_meta
 from subs_index import save_index as save_subs_index
 from subs_index import search_vector as search_subs
-from video_tools import detect_shots, extract_midframe, extract_multiframes
+from subs_index import search_vectors as search_subs_batch
+from video_tools import (
+    detect_shots,
+    extract_midframe,
+    extract_multiframes,
+    probe_duration,
+)
 
 app = FastAPI()
 
 # Serve everything in ~/ivs/data under /static
 app.mount("/static", StaticFiles(directory="../data"), name="static")
 
+INDEX_PATHS = [IMG_INDEX_PATH, SUBS_INDEX_PATH, SCENES_INDEX_PATH]
+# Recorded per video; a change makes /process_video re-ingest it
+MODELS = {"image": IMG_MODEL, "text": TEXT_MODEL, "asr": ASR_MODEL}
+
+
+def _load_generation(gen_dir):
+    """Search-only workers map the writer's published index files."""
+    for load, path in (
+        (load_img_index, IMG_INDEX_PATH),
+        (load_subs_index, SUBS_INDEX_PATH),
+        (load_scenes_index, SCENES_INDEX_PATH),
+    ):
+        load(os.path.join(gen_dir, os.path.basename(path)), read_only=True)
+
+
 # load indices
-load_img_index()
-load_subs_index()
+if serving.ROLE == "reader":
+    serving.maybe_reload(_load_generation, force=True)
+else:
+    load_img_index()
+    load_subs_index()
+    load_scenes_index()
+
+    # Build video_id → id-range map for data ingested before it existed
+    if not os.path.exists(RANGES_PATH):
+        rebuild_from_meta("shots", load_all())
+        rebuild_from_meta("subs", load_subs_meta())
+        rebuild_from_meta("scenes", load_scenes_meta())
+        rebuild_from_meta("videos", load_video_meta())
+    catalog.backfill(all_ranges(), load_all())
+    if serving.ROLE == "writer":
+        serving.publish(INDEX_PATHS)
+
+
+def _embed_shots(video_id, video_path, ingest_id, shots, timings):
+    """
+    Decode and CLIP-embed shots: (pooled vectors, per-frame vectors, metadata),
+    one per shot whose frames could be read.
+    """
+    shot_embeddings, shot_frames, metas = [], [], []
+
+    def decode(shot):
+        """Extract multiple frames per shot for better representation"""
+        s, e = shot
+        if scheduler.MODE == "search-priority":
+            with timings.stage("throttle"):
+                scheduler.throttle()
+        with timings.stage("decode"):
+            frames = extract_multiframes(video_path, s, e, num_frames=3)
+            loaded = []
+            for frame_path, frame_time in frames:
+                try:
+                    img = Image.open(frame_path).convert("RGB")
+                    loaded.append((frame_path, img))
+                except Exception as err:
+                    print(f"Warning: Could not load frame {frame_path}: {err}")
+        return s, e, loaded
+
+    def embed(decoded):
+        """Get embeddings for all frames in this shot"""
+        s, e, loaded = decoded
+        if not loaded:
+            return s, e, [], None
+        with timings.stage("embed"):
+            frame_embeddings = embed_images([img for _, img in loaded])
+        return s, e, [path for path, _ in loaded], frame_embeddings
+
+    # Decoding the next shots overlaps CLIP on the current one, with at
+    # most scheduler.QUEUE_SIZE decoded shots waiting
+    for s, e, frame_paths, frame_embeddings in scheduler.pipeline(
+        shots, [decode, embed]
+    ):
+        if frame_embeddings is None:
+            continue
+
+        # Average the embeddings (multi-frame pooling)
+        pooled_embedding = np.mean(frame_embeddings, axis=0)
+        shot_embeddings.append(pooled_embedding)
+        shot_frames.append(frame_embeddings)
+
+        # Use the middle frame as the representative thumbnail
+        mid = s + (e - s) / 2.0
+        representative_thumb = frame_paths[len(frame_paths) // 2]  # Middle frame
+
+        metas.append(
+            {
+                "video_id": video_id,
+                "ingest_id": ingest_id,
+                "video_path": video_path,
+                "start": s,
+                "end": e,
+                "mid": mid,
+                "thumb_rel": os.path.relpath(representative_thumb, "../data"),
+                "num_frames": len(frame_paths),  # Track how many frames were pooled
+            }
+        )
+
+    # Resized thumbnails for result pages
+    try:
+        with timings.stage("thumbs"):
+            for m in metas:
+                path = os.path.join("../data", m["thumb_rel"])
+                m["thumbs"] = make_thumbnails(path, ingest_id)
+    except Exception as e:
+        print(f"Warning: Could not build thumbnails: {e}")
+    return shot_embeddings, shot_frames, metas
+
+
+def _write_shots(
+    video_id, shot_embeddings, shot_frames, metas, dedup_threshold, timings
+):
+    """
+    Add embedded shots to the image index: (index id per shot in metas, with
+    the canonical id for duplicates; number of duplicates).
+    """
+    duplicates = 0
+    shot_ids = []
+    if shot_embeddings:
+        with timings.stage("index_write"):
+            # Add the pooled embeddings to the index
+            if dedup_threshold > 0:
+                # Never against a retired vector: a reprocessed video would
+                # otherwise become all duplicates of its own previous ingest
+                placed = add_img_vectors_dedup(
+                    shot_embeddings, dedup_threshold, exclude=retired_ids("shots")
+                )
+            else:
+                placed = [(i, False) for i in add_img_vectors(shot_embeddings)]
+            save_img_index()
+            new_ids = [i for i, is_dup in placed if not is_dup]
+            if new_ids:
+                add_range("shots", video_id, new_ids[0], new_ids[-1] + 1)
+                # Individual frame vectors, for per-frame re-ranking
+                frame_store.add_shots(
+                    new_ids[0],
+                    [f for f, (_, is_dup) in zip(shot_frames, placed) if not is_dup],
+                )
+            shot_ids = [i for i, _ in placed]
+            for m, (canonical_id, is_dup) in zip(metas, placed):
+                if is_dup:
+                    append_duplicate({**m, "canonical_id": canonical_id})
+                    duplicates += 1
+                else:
+                    append(m)
+    return shot_ids, duplicates
+
+
+def _transcribe(video_path, timings, start=0.0):
+    """ASR segments from `start` on; [] if ASR fails (e.g., not installed)."""
+    try:
+        if scheduler.MODE == "search-priority":
+            with timings.stage("throttle"):
+                scheduler.throttle()
+        with timings.stage("asr"):
+            return transcribe_to_segments(video_path, start=start)
+    except Exception:
+        return []
+
+
+def _write_segments(video_id, ingest_id, segments, tvecs, timings):
+    """Add embedded subtitle segments to the index: [(index id, metadata)]."""
+    if not segments:
+        return []
+    tmeta = [
+        {
+            "video_id": video_id,
+            "ingest_id": ingest_id,
+            "start": seg["start"],
+            "end": seg["end"],
+            "text": seg["text"],
+        }
+        for seg in segments
+    ]
+    with timings.stage("index_write"):
+        ids = add_subs_segments(tvecs, tmeta)
+        save_subs_index()
+        add_range("subs", video_id, ids.start, ids.stop)
+    return list(zip(ids, tmeta))
+
+
+def _write_scenes(video_id, ingest_id, shot_ids, metas, sub_hits, timings):
+    """Scene + video summary vectors for coarse-to-fine search; returns the count."""
+    try:
+        with timings.stage("scenes"):
+            scene_count = build_scenes(
+                video_id, ingest_id, list(zip(shot_ids, metas)), sub_hits
+            )
+            save_scenes_index()
+        return scene_count
+    except Exception as e:
+        print(f"Warning: Could not build scenes: {e}")
+        return 0
+
+
+def _publish():
+    if serving.ROLE == "writer":
+        generation = serving.publish(INDEX_PATHS)
+        print(f"📦 Published index generation {generation}")
+
+
+def _ingest_params(shot_threshold, dedup_threshold):
+    return {
+        "shot_threshold": shot_threshold,
+        "dedup_threshold": dedup_threshold,
+        "num_frames": 3,
+    }
+
+
+def _check_writer():
+    if serving.ROLE == "reader":
+        raise HTTPException(
+            status_code=403,
+            detail="Search-only worker (IVS_ROLE=reader): send ingestion to the writer",
+        )
 
 
 @app.post("/process_video")
@@ -35,122 +295,357 @@ def process_video(
     video_path: str = Form(...),
     video_id: str = Form(...),
     shot_threshold: int = Form(27),
+    dedup_threshold: float = Form(0.97),
+    force: bool = Form(False),
 ):
     """
     Process BOTH:
       1) Video shots (thumbnails + image embeddings)
       2) Audio subtitles (ASR) → text embeddings
+    Shots whose pooled embedding has cosine similarity >= dedup_threshold
+    with an already indexed shot are stored as references to it instead of
+    new index entries. dedup_threshold=0 disables deduplication.
+    Videos already in the catalogue with the same content and parameters
+    are skipped unless force=true. Reprocessing a video retires its old
+    index entries from search.
     """
-    import time
+    _check_writer()
+    if follow.is_following(video_id):
+        raise HTTPException(
+            status_code=409,
+            detail=f"{video_id} is being followed: POST /follow/stop first",
+        )
+    scheduler.apply_budgets()
 
     start_time = time.time()
+    timings = Timings()
 
     print(f"Processing video: {video_path}")
     assert os.path.exists(video_path), f"Video not found: {video_path}"
 
-    try:
-        # ----- 1) SHOTS → multi-frame pooled image embeddings -----
-        shots = detect_shots(video_path, threshold=shot_threshold)
-        shot_embeddings, metas = [], []
+    params = _ingest_params(shot_threshold, dedup_threshold)
+    with timings.stage("catalog"):
+        unchanged, content_hash = catalog.check_unchanged(
+            video_id, video_path, params, MODELS
+        )
+    if unchanged and not force:
+        entry = catalog.get(video_id)
+        print(f"⏭️ {video_id} unchanged since {entry.get('processed_at')}, skipping")
+        return {
+            "skipped": True,
+            "shots": entry.get("shots", 0),
+            "duplicate_shots": entry.get("duplicate_shots", 0),
+            "subtitle_segments": entry.get("subtitle_segments", 0),
+            "total_frames_processed": 0,
+            "processing_time_seconds": round(time.time() - start_time, 2),
+        }
 
-        for s, e in shots:
-            # Extract multiple frames per shot for better representation
-            frames = extract_multiframes(video_path, s, e, num_frames=3)
+    ingest_id = catalog.new_ingest_id()
+    retired = {}
 
-            if frames:
-                # Load and process all frames for this shot
-                frame_images = []
-                frame_paths = []
-                for frame_path, frame_time in frames:
-                    try:
-                        img = Image.open(frame_path).convert("RGB")
-                        frame_images.append(img)
-                        frame_paths.append(frame_path)
-                    except Exception as e:
-                        print(f"Warning: Could not load frame {frame_path}: {e}")
-                        continue
-
-                if frame_images:
-                    # Get embeddings for all frames in this shot
-                    frame_embeddings = embed_images(frame_images)
-
-                    # Average the embeddings (multi-frame pooling)
-                    pooled_embedding = np.mean(frame_embeddings, axis=0)
-                    shot_embeddings.append(pooled_embedding)
-
-                    # Use the middle frame as the representative thumbnail
-                    mid = s + (e - s) / 2.0
-                    representative_thumb = frame_paths[
-                        len(frame_paths) // 2
-                    ]  # Middle frame
-
-                    metas.append(
-                        {
-                            "video_id": video_id,
-                            "video_path": video_path,
-                            "start": s,
-                            "end": e,
-                            "mid": mid,
-                            "thumb_rel": os.path.relpath(
-                                representative_thumb, "../data"
-                            ),
-                            "num_frames": len(
-                                frame_images
-                            ),  # Track how many frames were pooled
-                        }
-                    )
-
-        if shot_embeddings:
-            # Add the pooled embeddings to the index
-            add_img_vectors(shot_embeddings)
-            save_img_index()
-            for m in metas:
-                append(m)
+    try:
+        # ----- 1) SHOTS → multi-frame pooled image embeddings -----
+        with timings.stage("detect"):
+            shots = detect_shots(video_path, threshold=shot_threshold)
+        shot_embeddings, shot_frames, metas = _embed_shots(
+            video_id, video_path, ingest_id, shots, timings
+        )
 
         # ----- 2) Subtitle (ASR) → text embeddings -----
         # If ASR fails (e.g., not installed), we still succeed on image path.
-        try:
-            # [{"start","end","text"}]
-            segments = transcribe_to_segments(video_path)
-            if segments:
-                texts = [seg["text"] for seg in segments]
-                tvecs = embed_text(texts)
-                tmeta = [
-                    {
-                        "video_id": video_id,
-                        "start": seg["start"],
-                        "end": seg["end"],
-                        "text": seg["text"],
-                    }
-                    for seg in segments
-                ]
-                add_subs_segments(tvecs, tmeta)
-                save_subs_index()
-            transcribed = len(segments)
-        except Exception:
-            transcribed = 0
-
-        total_frames = sum(m.get("num_frames", 1) for m in metas)
-
-        # Calculate processing time
-        end_time = time.time()
-        processing_time = end_time - start_time
+        segments = _transcribe(video_path, timings)
+        tvecs = None
+        if segments:
+            with timings.stage("embed"):
+                tvecs = embed_text([seg["text"] for seg in segments])
+
+        with scheduler.INGEST_LOCK:
+            # Selective reprocessing: old vectors stay in FAISS but leave search
+            retired = {kind: retire(kind, video_id) for kind in KINDS}
+            shot_ids, duplicates = _write_shots(
+                video_id, shot_embeddings, shot_frames, metas, dedup_threshold, timings
+            )
+            sub_hits = _write_segments(video_id, ingest_id, segments, tvecs, timings)
+
+            # ----- 3) Scene + video summary vectors for coarse-to-fine search -----
+            scene_count = _write_scenes(
+                video_id, ingest_id, shot_ids, metas, sub_hits, timings
+            )
+
+            total_frames = sum(m.get("num_frames", 1) for m in metas)
+
+            # Calculate processing time
+            end_time = time.time()
+            processing_time = end_time - start_time
+            timings["total"] = processing_time
+            timings.observe(INGEST)
+
+            catalog.record(
+                video_id,
+                {
+                    "video_id": video_id,
+                    "video_path": video_path,
+                    "ingest_id": ingest_id,
+                    "content_hash": content_hash,
+                    **catalog.file_stat(video_path),
+                    "duration": probe_duration(video_path)
+                    or max((e for _, e in shots), default=None),
+                    "shots": len(metas),
+                    "duplicate_shots": duplicates,
+                    "subtitle_segments": len(sub_hits),
+                    "scenes": scene_count,
+                    "total_frames_processed": total_frames,
+                    "id_ranges": {kind: get_ranges(kind, video_id) for kind in KINDS},
+                    "models": MODELS,
+                    "params": params,
+                    "processed_at": catalog.now(),
+                    "processing_time_seconds": round(processing_time, 2),
+                },
+            )
+            _publish()
 
         print(f"✅ Video processing completed in {processing_time:.2f} seconds")
+        print(f"   Stage timings: {timings.rounded(2)}")
 
         return {
             "shots": len(metas),
-            "subtitle_segments": transcribed,
+            "duplicate_shots": duplicates,
+            "subtitle_segments": len(sub_hits),
+            "scenes": scene_count,
             "total_frames_processed": total_frames,
             "processing_time_seconds": round(processing_time, 2),
         }
     except Exception as e:
         print(f"Error processing video: {e}")
+        # The catalogue still describes the previous ingest: take out whatever
+        # this one had written and put the previous one back in search
+        with scheduler.INGEST_LOCK:
+            for kind, ranges in retired.items():
+                retire(kind, video_id)
+                restore(kind, video_id, ranges)
         raise HTTPException(
             status_code=500, detail=f"Video processing failed: {str(e)}"
         )
 
 
+def _follow_step(video_id, final=False):
+    """
+    Index the part of a followed recording after its processed timestamps
+    (kept in the catalogue entry under "follow"). final=True: the recording
+    has ended, so nothing is held back.
+    """
+    start_time = time.time()
+    timings = Timings()
+    entry = catalog.get(video_id)
+    state, params = entry["follow"], entry["params"]
+    video_path, ingest_id = entry["video_path"], entry["ingest_id"]
+
+    with timings.stage("detect"):
+        detected = detect_shots(
+            video_path, threshold=params["shot_threshold"], start=state["shots_until"]
+        )
+    if not detected:
+        # No cut since shots_until, so PySceneDetect returns no shot at all:
+        # one shot runs to the current end of the file
+        duration = probe_duration(video_path)
+        if duration and duration > state["shots_until"]:
+            detected = [(state["shots_until"], duration)]
+    shots, shots_until = follow.complete_shots(detected, final)
+    if shots_until is None:
+        shots_until = state["shots_until"]
+    # Subtitles are indexed up to where the shots are, so both stay in step
+    segments, subs_until = follow.complete_segments(
+        _transcribe(video_path, timings, start=state["subs_until"]),
+        state["subs_until"],
+        shots_until,
+        final,
+    )
+    if not shots and not segments:
+        if subs_until > state["subs_until"]:
+            # Nothing to index, but the audio up to here has been transcribed
+            with scheduler.INGEST_LOCK:
+                entry = catalog.get(video_id)
+                entry["follow"]["subs_until"] = subs_until
+                catalog.record(video_id, entry)
+        return
+
+    shot_embeddings, shot_frames, metas = _embed_shots(
+        video_id, video_path, ingest_id, shots, timings
+    )
+    tvecs = None
+    if segments:
+        with timings.stage("embed"):
+            tvecs = embed_text([seg["text"] for seg in segments])
+
+    with scheduler.INGEST_LOCK:
+        shot_ids, duplicates = _write_shots(
+            video_id,
+            shot_embeddings,
+            shot_frames,
+            metas,
+            params["dedup_threshold"],
+            timings,
+        )
+        sub_hits = _write_segments(video_id, ingest_id, segments, tvecs, timings)
+        scene_count = _write_scenes(
+            video_id, ingest_id, shot_ids, metas, sub_hits, timings
+        )
+        timings["total"] = time.time() - start_time
+        timings.observe(INGEST)
+
+        entry = catalog.get(video_id)
+        entry["follow"].update(
+            shots_until=shots_until,
+            subs_until=subs_until,
+        )
+        entry.update(
+            duration=max(shots_until, entry["follow"]["subs_until"]),
+            shots=entry["shots"] + len(metas),
+            duplicate_shots=entry["duplicate_shots"] + duplicates,
+            subtitle_segments=entry["subtitle_segments"] + len(sub_hits),
+            scenes=entry["scenes"] + scene_count,
+            total_frames_processed=entry["total_frames_processed"]
+            + sum(m.get("num_frames", 1) for m in metas),
+            id_ranges={kind: get_ranges(kind, video_id) for kind in KINDS},
+            processed_at=catalog.now(),
+        )
+        catalog.record(video_id, entry)
+        _publish()
+    print(
+        f"📡 {video_id}: +{len(metas)} shots, +{len(sub_hits)} subtitle segments,"
+        f" indexed up to {shots_until:.1f}s in {timings['total']:.2f}s"
+    )
+
+
+def _follow_status(video_id):
+    entry = catalog.get(video_id)
+    return {
+        "video_id": video_id,
+        "video_path": entry["video_path"],
+        "following": follow.is_following(video_id),
+        **entry["follow"],
+        "shots": entry["shots"],
+        "subtitle_segments": entry["subtitle_segments"],
+        "scenes": entry["scenes"],
+        "processed_at": entry["processed_at"],
+    }
+
+
+@app.post("/follow/start")
+def follow_start(
+    video_path: str = Form(...),
+    video_id: str = Form(...),
+    shot_threshold: int = Form(27),
+    dedup_threshold: float = Form(0.97),
+    restart: bool = Form(False),
+):
+    """
+    Tail-follow a recording that is still being written (live event, DVR
+    capture): every IVS_FOLLOW_POLL_S seconds, the part of the file added
+    since the last pass is shot-detected, transcribed and indexed, so it is
+    searchable seconds after it was recorded. The processed timestamps are
+    kept in the catalogue, so following a video_id again (or restarting the
+    API) resumes where it stopped, with its original parameters.
+    restart=true retires what was indexed and starts from 0.
+    """
+    _check_writer()
+    if not os.path.exists(video_path):
+        raise HTTPException(status_code=404, detail=f"Video not found: {video_path}")
+    scheduler.apply_budgets()
+
+    entry = catalog.get(video_id)
+    resume = (
+        entry
+        and entry.get("follow")
+        and entry["video_path"] == video_path
+        and not restart
+    )
+    if entry and not resume:
+        follow.stop(video_id)
+    with scheduler.INGEST_LOCK:
+        if resume:
+            entry["follow"]["active"] = True
+        else:
+            if entry:
+                for kind in KINDS:
+                    retire(kind, video_id)
+            entry = {
+                "video_id": video_id,
+                "video_path": video_path,
+                "ingest_id": catalog.new_ingest_id(),
+                "content_hash": None,  # set when following stops
+                "duration": 0.0,
+                "shots": 0,
+                "duplicate_shots": 0,
+                "subtitle_segments": 0,
+                "scenes": 0,
+                "total_frames_processed": 0,
+                "id_ranges": {},
+                "models": MODELS,
+                "params": _ingest_params(shot_threshold, dedup_threshold),
+                "processed_at": catalog.now(),
+                "follow": {"active": True, "shots_until": 0.0, "subs_until": 0.0},
+            }
+        catalog.record(video_id, entry)
+    if follow.start(video_id, video_path, _follow_step):
+        print(f"📡 Following {video_id} from {entry['follow']['shots_until']:.1f}s")
+    return _follow_status(video_id)
+
+
+@app.post("/follow/stop")
+def follow_stop(video_id: str = Form(...), finish: bool = Form(True)):
+    """
+    Stop following video_id. finish=true (the recording has ended) also
+    indexes the trailing shot and subtitles that were held back, and stamps
+    the file in the catalogue so /process_video sees it as unchanged.
+    finish=false pauses: /follow/start resumes later.
+    """
+    _check_writer()
+    entry = catalog.get(video_id)
+    if not entry or not entry.get("follow"):
+        raise HTTPException(status_code=404, detail=f"{video_id} is not followed")
+    follow.stop(video_id)
+    with scheduler.INGEST_LOCK:
+        entry = catalog.get(video_id)
+        entry["follow"]["active"] = False
+        catalog.record(video_id, entry)
+    if finish:
+        # Here rather than in the follower thread: a paused follow has none,
+        # and the file is only stamped once its tail is really indexed
+        try:
+            _follow_step(video_id, final=True)
+        except Exception as e:
+            print(f"Error indexing the end of {video_id}: {e}")
+            raise HTTPException(
+                status_code=500, detail=f"Indexing the end failed: {str(e)}"
+            )
+        with scheduler.INGEST_LOCK:
+            entry = catalog.get(video_id)
+            entry.update(
+                content_hash=catalog.content_hash(entry["video_path"]),
+                **catalog.file_stat(entry["video_path"]),
+            )
+            catalog.record(video_id, entry)
+    return _follow_status(video_id)
+
+
+@app.get("/follow")
+def follow_list():
+    """Every followed recording with its progress, keyed by video_id."""
+    return {
+        video_id: _follow_status(video_id)
+        for video_id, entry in catalog.load_all().items()
+        if entry.get("follow")
+    }
+
+
+# Resume following recordings that were followed when the API stopped
+if serving.ROLE != "reader":
+    for _entry in list(catalog.load_all().values()):
+        if _entry.get("follow", {}).get("active"):
+            follow.start(_entry["video_id"], _entry["video_path"], _follow_step)
+
+
 def _minmax(scores):
     if not scores:
         return []
@@ -160,42 +655,402 @@ def _minmax(scores):
     return [(s - lo) / (hi - lo) for s in scores]
 
 
-@app.post("/search")
-def search(query: str = Form(...), k: int = Form(8), alpha: float = Form(0.6)):
+def _matches(m, videos, start_time, end_time):
+    """Does a result's metadata pass the search filters?"""
+    if videos is not None and m.get("video_id") not in videos:
+        return False
+    if start_time is not None and m.get("end", 0.0) < start_time:
+        return False
+    if end_time is not None and m.get("start", 0.0) > end_time:
+        return False
+    return True
+
+
+def _search_state():
+    """Metadata and excluded ids shared by every search until the next ingest."""
+    serving.maybe_reload(_load_generation)
+    state = {"img_meta": load_all(), "subs_meta": load_subs_meta()}
+    state["dupes"] = {
+        cid: live
+        for cid, occ in load_duplicates().items()
+        if (live := [d for d in occ if catalog.is_live(d)])
+    }
+    # Ids of reprocessed videos' old ingests are excluded inside the index.
+    # A retired canonical vector stays searchable while live duplicates use it
+    # (another video's shots deduplicated against a since-reprocessed video).
+    state["img_exclude"] = np.setdiff1d(retired_ids("shots"), list(state["dupes"]))
+    state["sub_exclude"] = retired_ids("subs")
+    return state
+
+
+def _prepare_search(video_id, start_time, end_time, expand_duplicates, state=None):
+    """Resolve search filters to index ids, on top of _search_state()."""
+    ctx = dict(state or _search_state())
+    ctx.update(
+        videos=[v.strip() for v in video_id.split(",")] if video_id else None,
+        start_time=start_time,
+        end_time=end_time,
+        expand_duplicates=expand_duplicates,
+        img_ids=None,
+        sub_ids=None,
+    )
+    ctx["filtered"] = (
+        ctx["videos"] is not None or start_time is not None or end_time is not None
+    )
+    if ctx["filtered"]:
+        # Shots deduplicated against another video's shot are found
+        # through their canonical id, then filtered per occurrence later.
+        extra = [
+            cid
+            for cid, occ in ctx["dupes"].items()
+            if any(_matches(d, ctx["videos"], start_time, end_time) for d in occ)
+        ]
+        ctx["img_ids"] = select_ids(
+            "shots", ctx["img_meta"], ctx["videos"], start_time, end_time, extra
+        )
+        ctx["sub_ids"] = select_ids(
+            "subs", ctx["subs_meta"], ctx["videos"], start_time, end_time
+        )
+    return ctx
+
+
+def _scene_search(ctx, qvec, n_scenes):
     """
-    Fused search:
-      - Image index (image shots) scored by CLIP(text→image)
-      - Subtitle index (subtitle/ASR) scored by CLIP(text→text)
-    alpha weights image; (1 - alpha) weights subtitles.
+    Coarse-to-fine: on large libraries first pick the top videos, then the
+    top n_scenes scenes (of those videos, or of the filters), and restrict
+    ctx's shot / segment ids to the children of those scenes.
+    Sets ctx["scenes"] to the selected scenes, best first.
     """
-    print(f"🔍 Searched for: '{query}'")
-    qvec = embed_text([query])[0]
+    scene_meta = load_scenes_meta()
+    ctx["scenes"] = None
+    if not scene_meta:
+        return  # no scene level yet: plain search
+    videos = ctx["videos"]
+    if videos is None and len(video_ids("videos")) > SCENE_TOP_VIDEOS:
+        video_meta = load_video_meta()
+        rows = search_videos(qvec, SCENE_TOP_VIDEOS, exclude=retired_ids("videos"))
+        videos = [video_meta[i]["video_id"] for i in rows]
+    scene_ids = None
+    if videos is not None or ctx["filtered"]:
+        scene_ids = select_ids(
+            "scenes", scene_meta, videos, ctx["start_time"], ctx["end_time"]
+        )
+    idx, scores = search_scenes(
+        qvec, n_scenes, ids=scene_ids, exclude=retired_ids("scenes")
+    )
+    scenes = [
+        {**scene_meta[i], "scene_id": i, "score": float(s)}
+        for i, s in zip(idx, scores)
+        if 0 <= i < len(scene_meta) and catalog.is_live(scene_meta[i])
+    ]
+    img_ids = np.unique(
+        np.asarray([i for sc in scenes for i in sc["shot_ids"]], "int64")
+    )
+    sub_ids = np.unique(
+        np.asarray([i for sc in scenes for i in sc["sub_ids"]], "int64")
+    )
+    if ctx["img_ids"] is not None:
+        img_ids = np.intersect1d(img_ids, ctx["img_ids"])
+        sub_ids = np.intersect1d(sub_ids, ctx["sub_ids"])
+    ctx["img_ids"], ctx["sub_ids"] = img_ids, sub_ids
+    ctx["filtered"] = True
+    ctx["scenes"] = scenes
+
+
+def _assign_scenes(results, scenes):
+    """Tag results with the nearest selected scene of their video; drop the rest."""
+    kept = []
+    for r in results:
+        mid = (r.get("start", 0.0) + r.get("end", 0.0)) / 2
+        same = [sc for sc in scenes if sc["video_id"] == r.get("video_id")]
+        if not same:
+            continue
+        gaps = [max(sc["start"] - mid, mid - sc["end"], 0) for sc in same]
+        n = int(np.argmin(gaps))
+        # Subtitles between two scenes belong to one of them; a shot reached
+        # through a shared (deduplicated) id must lie inside a selected scene
+        if r["type"] == "subtitle" or gaps[n] == 0:
+            r["scene_id"] = same[n]["scene_id"]
+            kept.append(r)
+    return kept
+
 
-    # Images
-    vid_idx, vid_scores = search_img(qvec, k)
-    img_meta = load_all()
+def _group_by_scene(results, scenes):
+    """Selected scenes (best first) with their results, leaving out empty ones."""
+    groups = []
+    for sc in scenes:
+        members = [r for r in results if r["scene_id"] == sc["scene_id"]]
+        if members:
+            groups.append(
+                {
+                    "scene_id": sc["scene_id"],
+                    "video_id": sc["video_id"],
+                    "start": sc["start"],
+                    "end": sc["end"],
+                    "score": sc["score"],
+                    "results": members,
+                }
+            )
+    return groups
+
+
+def _add_media_urls(m):
+    """Full-size thumbnail plus cacheable resized variants."""
+    m["thumb_url"] = f"/static/{m['thumb_rel']}"
+    if m.get("thumbs"):
+        m["thumb_urls"] = {w: f"/media/{p}" for w, p in m["thumbs"].items()}
+
+
+def _image_results(ctx, vid_idx, vid_scores):
+    """
+    Shots deduplicated against a hit share its score. By default they are
+    listed under one result per canonical vector ("occurrences"), so copies
+    of one scene don't fill the top k; with expand_duplicates, or a filter
+    (checked per occurrence), each becomes its own result.
+    """
+    img_meta, dupes = ctx["img_meta"], ctx["dupes"]
+    expand = ctx["expand_duplicates"] or ctx["filtered"]
     vid_results = []
     for i, s in zip(vid_idx, vid_scores):
-        if 0 <= i < len(img_meta):
-            m = img_meta[i].copy()
+        if not 0 <= i < len(img_meta):
+            continue
+        hits = [img_meta[i]] if catalog.is_live(img_meta[i]) else []
+        hits += dupes.get(i, [])
+        if hits and not expand:
+            occurrences = [
+                {"video_id": d["video_id"], "start": d["start"], "end": d["end"]}
+                for d in hits[1:]
+            ]
+            hits = [{**hits[0], "occurrences": occurrences}]
+        for h in hits:
+            m = h.copy()
             m["score_v"] = float(s)
             m["type"] = "image"
-            m["thumb_url"] = f"/static/{m['thumb_rel']}"
+            _add_media_urls(m)
             vid_results.append(m)
 
-    # Subtitles
-    sub_idx, sub_scores = search_subs(qvec, k)
-    subs_meta = load_subs_meta()
+    if ctx["filtered"]:
+        vid_results = [
+            r
+            for r in vid_results
+            if _matches(r, ctx["videos"], ctx["start_time"], ctx["end_time"])
+        ]
+    return vid_results
+
+
+def _subtitle_results(ctx, sub_idx, sub_scores):
+    subs_meta = ctx["subs_meta"]
     sub_results = []
     for i, s in zip(sub_idx, sub_scores):
-        if 0 <= i < len(subs_meta):
+        if 0 <= i < len(subs_meta) and catalog.is_live(subs_meta[i]):
             m = subs_meta[i].copy()
             m["score_t"] = float(s)
             m["type"] = "subtitle"
             m["thumb_url"] = None
             sub_results.append(m)
+    return sub_results
+
 
-    # Normalize & fuse
+@app.post("/search")
+def search(
+    query: str = Form(...),
+    k: int = Form(8),
+    alpha: float = Form(0.6),
+    expand_duplicates: bool = Form(False),
+    video_id: str | None = Form(None),
+    start_time: float | None = Form(None),
+    end_time: float | None = Form(None),
+    debug_timings: bool = Form(False),
+    rerank: bool = Form(False),
+    candidates: int = Form(RERANK_CANDIDATES),
+    pooling: str = Form("mean"),
+    scenes: int = Form(0),
+):
+    """
+    Fused search:
+      - Image index (image shots) scored by CLIP(text→image)
+      - Subtitle index (subtitle/ASR) scored by CLIP(text→text)
+    alpha weights image; (1 - alpha) weights subtitles.
+    Deduplicated copies of a hit shot are listed in its "occurrences";
+    expand_duplicates (implied by the filters) returns each as a result.
+    Optional filters (applied inside the index, before top-k):
+      video_id: one or more comma-separated video ids
+      start_time / end_time: only moments overlapping [start_time, end_time]
+    debug_timings adds per-stage seconds to the response.
+    rerank fetches the top `candidates` hits of each index, then re-scores
+    them with per-frame max similarity, neighbouring shots/segments and
+    keyword overlap with the query (see rerank.py) before taking the top k.
+    pooling scores shots by their stored frames: "mean" (default, the index
+    vector), "max" (element-wise max over frames) or "top1" (best frame).
+    Other than "mean" it re-scores the top `candidates` shots.
+    scenes > 0 searches coarse-to-fine: only the shots and segments of the
+    top `scenes` scenes are searched, and the response also groups the
+    results by scene.
+    """
+    if pooling not in POOLINGS:
+        raise HTTPException(
+            status_code=400, detail=f"pooling must be one of {', '.join(POOLINGS)}"
+        )
+    print(f"🔍 Searched for: '{query}'")
+    timings = Timings()
+    with timings.stage("total"):
+        with timings.stage("embed"):
+            qvec = embed_text([query])[0]
+
+        with timings.stage("metadata"):
+            ctx = _prepare_search(video_id, start_time, end_time, expand_duplicates)
+
+        if scenes > 0:
+            with timings.stage("faiss_scenes"):
+                _scene_search(ctx, qvec, scenes)
+
+        # Wide first stage when shots (pooling) or both indexes (rerank) are re-scored
+        sub_k = max(k, candidates) if rerank else k
+        img_k = max(k, candidates) if rerank or pooling != "mean" else k
+
+        # Images
+        with timings.stage("faiss_shots"):
+            vid_idx, vid_scores = search_img(
+                qvec, img_k, ids=ctx["img_ids"], exclude=ctx["img_exclude"]
+            )
+
+        # Subtitles
+        with timings.stage("faiss_subs"):
+            sub_idx, sub_scores = search_subs(
+                qvec, sub_k, ids=ctx["sub_ids"], exclude=ctx["sub_exclude"]
+            )
+
+        if pooling != "mean":
+            with timings.stage("pooling"):
+                vid_scores = pooled_scores(qvec, vid_idx, vid_scores, pooling).tolist()
+
+        if rerank:
+            with timings.stage("rerank"):
+                vid_idx, vid_scores = rerank_shots(
+                    query, qvec, vid_idx, vid_scores, ctx["img_meta"], ctx["subs_meta"]
+                )
+                sub_idx, sub_scores = rerank_subs(
+                    query, qvec, sub_idx, sub_scores, ctx["subs_meta"]
+                )
+
+        with timings.stage("metadata"):
+            vid_results = _image_results(ctx, vid_idx, vid_scores)
+            sub_results = _subtitle_results(ctx, sub_idx, sub_scores)
+            if ctx.get("scenes"):
+                vid_results = _assign_scenes(vid_results, ctx["scenes"])
+                sub_results = _assign_scenes(sub_results, ctx["scenes"])
+
+        with timings.stage("fusion"):
+            results = _fuse(vid_results, sub_results, alpha, k)
+
+    timings.observe(SEARCH)
+    scheduler.report_search_latency()
+    response = {"results": results, "alpha_used": alpha}
+    if ctx.get("scenes") is not None:
+        response["scenes"] = _group_by_scene(results, ctx["scenes"])
+    if debug_timings:
+        response["debug_timings"] = timings.rounded()
+    return response
+
+
+def _encode_and_search(batch):
+    """
+    Micro-batch handler: metadata is loaded once and the queries are
+    embedded in one embed_text call, then the unfiltered ones are searched
+    in one batch per index (filtered queries search their own id subset).
+    batch items are (query, k, filters), filters being _prepare_search's
+    arguments; returns (image hits, subtitle hits, ctx, shared timings).
+    """
+    timings = Timings()
+    with timings.stage("metadata"):
+        state = _search_state()
+        ctxs = [_prepare_search(*filters, state=state) for _, _, filters in batch]
+    with timings.stage("embed"):
+        Q = embed_text([query for query, _, _ in batch])
+
+    hits = [None] * len(batch)
+    plain = [n for n, ctx in enumerate(ctxs) if not ctx["filtered"]]
+    if plain:
+        kmax = max(batch[n][1] for n in plain)
+        with timings.stage("faiss_shots"):
+            vD, vI = search_img_batch(Q[plain], kmax, exclude=state["img_exclude"])
+        with timings.stage("faiss_subs"):
+            sD, sI = search_subs_batch(Q[plain], kmax, exclude=state["sub_exclude"])
+        for row, n in enumerate(plain):
+            k = batch[n][1]
+            hits[n] = (
+                (vI[row, :k].tolist(), vD[row, :k].tolist()),
+                (sI[row, :k].tolist(), sD[row, :k].tolist()),
+            )
+    for n, ((_, k, _), ctx) in enumerate(zip(batch, ctxs)):
+        if hits[n] is None:
+            with timings.stage("faiss_shots"):
+                v = search_img(Q[n], k, ids=ctx["img_ids"])
+            with timings.stage("faiss_subs"):
+                t = search_subs(Q[n], k, ids=ctx["sub_ids"])
+            hits[n] = (v, t)
+
+    shared = {**timings, "batch_size": len(batch)}
+    return [(v, t, ctx, shared) for (v, t), ctx in zip(hits, ctxs)]
+
+
+_search_batcher = MicroBatcher(_encode_and_search)
+
+
+@app.post("/search_async")
+async def search_async(
+    query: str = Form(...),
+    k: int = Form(8),
+    alpha: float = Form(0.6),
+    expand_duplicates: bool = Form(False),
+    video_id: str | None = Form(None),
+    start_time: float | None = Form(None),
+    end_time: float | None = Form(None),
+    debug_timings: bool = Form(False),
+    rerank: bool = Form(False),
+    pooling: str = Form("mean"),
+    scenes: int = Form(0),
+):
+    """
+    Same as /search, but queries from concurrent requests arriving within a
+    few milliseconds are encoded and searched together in one batch.
+    Re-ranking, frame pooling and scene search are /search only.
+    """
+    if rerank or pooling != "mean" or scenes:
+        raise HTTPException(
+            status_code=400,
+            detail="rerank, pooling and scenes are not supported here: use /search",
+        )
+    timings = Timings()
+    with timings.stage("total"):
+        with timings.stage("batch"):
+            filters = (video_id, start_time, end_time, expand_duplicates)
+            vid_hits, sub_hits, ctx, shared = await _search_batcher.submit(
+                (query, k, filters)
+            )
+
+        with timings.stage("metadata"):
+            vid_results = _image_results(ctx, *vid_hits)
+            sub_results = _subtitle_results(ctx, *sub_hits)
+
+        with timings.stage("fusion"):
+            results = _fuse(vid_results, sub_results, alpha, k)
+
+    # metadata / embed / FAISS time is shared by the whole batch
+    shared = dict(shared)
+    batch_size = shared.pop("batch_size")
+    for name, seconds in shared.items():
+        timings[name] = timings.get(name, 0.0) + seconds
+    timings.observe(SEARCH)
+    scheduler.report_search_latency()
+    response = {"results": results, "alpha_used": alpha}
+    if debug_timings:
+        response["debug_timings"] = {**timings.rounded(), "batch_size": batch_size}
+    return response
+
+
+def _fuse(vid_results, sub_results, alpha, k):
+    """Min-max normalize each modality, weight by alpha, dedup, take top k."""
     nv = _minmax([r["score_v"] for r in vid_results]) if vid_results else []
     nt = _minmax([r["score_t"] for r in sub_results]) if sub_results else []
     for r, s in zip(vid_results, nv):
@@ -222,4 +1077,44 @@ def search(query: str = Form(...), k: int = Form(8), alpha: float = Form(0.6)):
             deduplicated.append(r)
 
     deduplicated.sort(key=lambda x: x["final"], reverse=True)
-    return {"results": deduplicated[:k], "alpha_used": alpha}
+    return deduplicated[:k]
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Per-stage latency histograms in Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.api_route("/media/{rel_path:path}", methods=["GET", "HEAD"])
+def media(rel_path: str, request: Request):
+    """
+    Files under ~/ivs/data (thumbnails, resized thumbnails, videos) with strong
+    ETags, Cache-Control and HTTP Range support for seeking in videos.
+    """
+    return serve_media(rel_path, request)
+
+
+@app.get("/serving")
+def serving_status():
+    """Role of this process and which index generation it searches."""
+    return {
+        "role": serving.ROLE,
+        "pid": os.getpid(),
+        "generation_loaded": serving.loaded_generation(),
+        "generation_current": serving.current_generation(),
+    }
+
+
+@app.get("/catalog")
+def list_catalog():
+    """Every processed video: content hash, counts, id ranges, models, params."""
+    return catalog.load_all()
+
+
+@app.get("/catalog/{video_id}")
+def catalog_entry(video_id: str):
+    entry = catalog.get(video_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"{video_id} not processed")
+    return entry
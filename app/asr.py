@@ -1,6 +1,9 @@
 import os
+import subprocess
 
+import numpy as np
 from faster_whisper import WhisperModel
+from scheduler import THREADS
 
 
 def get_best_device():
@@ -12,30 +15,71 @@ def get_best_device():
     return "cpu"  # Force CPU for Whisper to avoid cuDNN errors
 
 
+MODEL_SIZE = "base"
+
 _model = None
 
 
-def get_model(model_size="base"):
+def get_model(model_size=MODEL_SIZE):
     global _model
     if _model is None:
         device = get_best_device()
-        _model = WhisperModel(model_size, device=device, compute_type="int8")
+        _model = WhisperModel(
+            model_size,
+            device=device,
+            compute_type="int8",
+            cpu_threads=THREADS["asr"],
+        )
     return _model
 
 
-def transcribe_to_segments(video_path, vad=True):
+def _audio_from(video_path, start, rate):
+    """
+    Mono float32 audio of video_path from `start` seconds on. ffmpeg seeks
+    before decoding, so resuming near the end of a long recording is cheap.
+    """
+    pcm = subprocess.run(
+        [
+            "ffmpeg",
+            "-nostdin",
+            "-threads",
+            str(THREADS["decode"]),
+            "-ss",
+            str(start),
+            "-i",
+            video_path,
+            "-vn",
+            "-ac",
+            "1",
+            "-ar",
+            str(rate),
+            "-f",
+            "s16le",
+            "-",
+        ],
+        check=True,
+        capture_output=True,
+    ).stdout
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def transcribe_to_segments(video_path, vad=True, start=0.0):
     """
     Returns list of dicts: [{"start": float, "end": float, "text": str}, ...]
+    start skips the audio before that many seconds (times stay absolute).
     """
     assert os.path.exists(video_path), f"Not found: {video_path}"
     model = get_model()
-    segments, _ = model.transcribe(video_path, vad_filter=vad)
+    audio = video_path
+    if start > 0:
+        audio = _audio_from(video_path, start, model.feature_extractor.sampling_rate)
+    segments, _ = model.transcribe(audio, vad_filter=vad)
     out = []
     for seg in segments:
         out.append(
             {
-                "start": float(seg.start or 0.0),
-                "end": float(seg.end or 0.0),
+                "start": start + float(seg.start or 0.0),
+                "end": start + float(seg.end or 0.0),
                 "text": (seg.text or "").strip(),
             }
         )
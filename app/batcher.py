@@ -0,0 +1,58 @@
+import asyncio
+import os
+
+# Queries arriving within MAX_WAIT_MS of each other are handled in one batch
+MAX_BATCH = int(os.environ.get("IVS_BATCH_MAX", "32"))
+MAX_WAIT_MS = float(os.environ.get("IVS_BATCH_WAIT_MS", "5"))
+
+
+class MicroBatcher:
+    """
+    Collects items submitted by concurrent requests and hands them to
+    handler(items) -> results in one call, run in a worker thread. Each
+    caller awaits only its own result.
+    """
+
+    def __init__(self, handler, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = None
+        self._task = None
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item):
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            items = [item for item, _ in batch]
+            try:
+                results = await asyncio.to_thread(self.handler, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
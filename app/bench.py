@@ -0,0 +1,250 @@
+"""
+Offline benchmarks for ingestion and search. Run from app/:
+
+    python bench.py search --sizes 10000 100000 --modes flat fp16 pq
+    python bench.py ingest --duration 60
+    python bench.py all
+    python bench.py compare ../data/bench/a.json ../data/bench/b.json
+
+Videos are generated with ffmpeg's lavfi sources (testsrc/sine), vector
+corpora are seeded synthetic clusters, so runs are comparable across
+machines and commits. Results are written as JSON to ../data/bench/.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+import vector_store
+
+OUT_DIR = os.path.join("../data", "bench")
+CHUNK = 100_000  # vectors generated / added per step, bounds peak RAM
+
+# lavfi video sources cycled to give the shot detector hard cuts
+_SOURCES = ["testsrc", "smptebars", "testsrc2", "rgbtestsrc", "mandelbrot"]
+
+
+def make_test_video(path, duration=60.0, shot_len=5.0, size="640x360", rate=25):
+    """Synthetic video: a hard cut every shot_len seconds + a sine tone."""
+    n_shots = max(1, int(round(duration / shot_len)))
+    cmd = ["ffmpeg", "-y", "-loglevel", "error"]
+    for i in range(n_shots):
+        src = _SOURCES[i % len(_SOURCES)]
+        cmd += [
+            "-f",
+            "lavfi",
+            "-i",
+            f"{src}=duration={shot_len}:size={size}:rate={rate}",
+        ]
+    cmd += ["-f", "lavfi", "-i", f"sine=frequency=440:duration={n_shots * shot_len}"]
+    chain = "".join(f"[{i}:v]" for i in range(n_shots))
+    cmd += [
+        "-filter_complex",
+        f"{chain}concat=n={n_shots}:v=1:a=0[v]",
+        "-map",
+        "[v]",
+        "-map",
+        f"{n_shots}:a",
+        "-c:v",
+        "libx264",
+        "-pix_fmt",
+        "yuv420p",
+        "-c:a",
+        "aac",
+        "-shortest",
+        path,
+    ]
+    subprocess.run(cmd, check=True)
+    return n_shots * shot_len, n_shots
+
+
+def synthetic_vectors(n, dim=vector_store.DIM, n_clusters=1000, seed=0):
+    """Yield normalized float32 chunks of a clustered corpus (CLIP-like)."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)).astype("float32")
+    faiss.normalize_L2(centers)
+    for lo in range(0, n, CHUNK):
+        m = min(CHUNK, n - lo)
+        X = centers[rng.integers(0, n_clusters, m)]
+        X = X + rng.normal(scale=0.08, size=(m, dim)).astype("float32")
+        faiss.normalize_L2(X)
+        yield X
+
+
+def _percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def bench_search(sizes, modes, ks, n_queries=500, seed=0):
+    rows = []
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            vectors = vector_store.VectorFile(os.path.join(tmp, "vectors.f32"))
+            for X in synthetic_vectors(n, seed=seed):
+                vectors.append(X)
+            rng = np.random.default_rng(seed + 1)
+            Q = np.asarray(vectors.view()[rng.integers(0, n, n_queries)])
+            Q = Q + rng.normal(scale=0.05, size=Q.shape).astype("float32")
+            faiss.normalize_L2(Q)
+
+            for mode in modes:
+                t0 = time.perf_counter()
+                index = vector_store.rebuild(vectors, mode)
+                build_s = time.perf_counter() - t0
+                for k in ks:
+                    vector_store.search(index, vectors, Q[:10], k)  # warm up
+                    lat = []
+                    t0 = time.perf_counter()
+                    for q in Q:
+                        s = time.perf_counter()
+                        vector_store.search(index, vectors, q[None, :], k)
+                        lat.append(time.perf_counter() - s)
+                    total = time.perf_counter() - t0
+                    row = {
+                        "n": n,
+                        "mode": mode,
+                        "k": k,
+                        "build_s": round(build_s, 3),
+                        "bytes_per_vector": vector_store.bytes_per_vector(index),
+                        "p50_ms": _percentile_ms(lat, 50),
+                        "p99_ms": _percentile_ms(lat, 99),
+                        "qps": round(n_queries / total, 1),
+                    }
+                    print(row)
+                    rows.append(row)
+    return rows
+
+
+def bench_ingest(duration, shot_len, threshold=27, skip_models=False):
+    from video_tools import detect_shots, extract_multiframes
+
+    result = {"video_seconds": duration}
+    with tempfile.TemporaryDirectory() as tmp:
+        video = os.path.join(tmp, "bench.mp4")
+        duration, n_shots = make_test_video(video, duration, shot_len)
+        rate = 25
+
+        t0 = time.perf_counter()
+        shots = detect_shots(video, threshold=threshold)
+        dt = time.perf_counter() - t0
+        result.update(
+            {
+                "expected_shots": n_shots,
+                "detected_shots": len(shots),
+                "shot_detect_fps": round(duration * rate / dt, 1),
+            }
+        )
+
+        t0 = time.perf_counter()
+        frames = []
+        for s, e in shots:
+            frames += extract_multiframes(video, s, e, out_dir=tmp, num_frames=3)
+        dt = time.perf_counter() - t0
+        result["frame_extract_fps"] = round(len(frames) / dt, 1) if dt else None
+
+        if skip_models:
+            return result
+
+        from models import embed_images
+        from PIL import Image
+
+        images = [Image.open(p).convert("RGB") for p, _ in frames]
+        embed_images(images[:2])  # warm up
+        t0 = time.perf_counter()
+        embed_images(images)
+        dt = time.perf_counter() - t0
+        result["frames_embedded_per_s"] = round(len(images) / dt, 1)
+
+        from asr import transcribe_to_segments
+
+        t0 = time.perf_counter()
+        transcribe_to_segments(video)
+        result["asr_rtf"] = round((time.perf_counter() - t0) / duration, 3)
+    return result
+
+
+def environment():
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "faiss": faiss.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def write_results(results, out=None):
+    os.makedirs(OUT_DIR, exist_ok=True)
+    out = out or os.path.join(OUT_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {out}")
+
+
+def compare(path_a, path_b):
+    """Print search metrics of run b relative to run a."""
+    with open(path_a) as f:
+        a = json.load(f)
+    with open(path_b) as f:
+        b = json.load(f)
+    base = {(r["n"], r["mode"], r["k"]): r for r in a.get("search", [])}
+    for r in b.get("search", []):
+        old = base.get((r["n"], r["mode"], r["k"]))
+        if not old:
+            continue
+        print(
+            f"n={r['n']:>9} {r['mode']:>4} k={r['k']:>3}  "
+            f"p50 {old['p50_ms']:.3f}→{r['p50_ms']:.3f} ms  "
+            f"p99 {old['p99_ms']:.3f}→{r['p99_ms']:.3f} ms  "
+            f"qps {old['qps']}→{r['qps']}"
+        )
+    for key, new in b.get("ingest", {}).items():
+        old = a.get("ingest", {}).get(key)
+        if old != new:
+            print(f"ingest {key}: {old}→{new}")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("what", choices=["search", "ingest", "all", "compare"])
+    p.add_argument("files", nargs="*", help="two result files for compare")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    p.add_argument("--modes", nargs="+", default=["flat", "fp16", "pq"])
+    p.add_argument("--k", type=int, nargs="+", default=[1, 8, 50])
+    p.add_argument("--queries", type=int, default=500)
+    p.add_argument("--duration", type=float, default=60.0)
+    p.add_argument("--shot-len", type=float, default=5.0)
+    p.add_argument("--skip-models", action="store_true", help="no CLIP / ASR")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out")
+    args = p.parse_args(argv)
+
+    if args.what == "compare":
+        if len(args.files) != 2:
+            p.error("compare needs two result files")
+        compare(*args.files)
+        return
+
+    results = {"environment": environment(), "args": vars(args)}
+    if args.what in ("ingest", "all"):
+        results["ingest"] = bench_ingest(
+            args.duration, args.shot_len, skip_models=args.skip_models
+        )
+        print(results["ingest"])
+    if args.what in ("search", "all"):
+        results["search"] = bench_search(
+            args.sizes, args.modes, args.k, args.queries, args.seed
+        )
+    write_results(results, args.out)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+
+# One entry per ingested video_id: what was indexed, from which file, with
+# which models and parameters. Lets ingestion skip unchanged videos and the
+# UI check "already processed" without scanning thumbnail directories.
+CATALOG_PATH = os.path.join("../data", "catalog.json")
+
+_catalog = None
+_mtime = None
+
+
+def _load():
+    global _catalog, _mtime
+    mtime = os.path.getmtime(CATALOG_PATH) if os.path.exists(CATALOG_PATH) else None
+    if _catalog is None or mtime != _mtime:
+        if mtime is None:
+            _catalog = {}
+        else:
+            with open(CATALOG_PATH) as f:
+                _catalog = json.load(f)
+        _mtime = mtime
+    return _catalog
+
+
+def _save():
+    global _mtime
+    os.makedirs(os.path.dirname(CATALOG_PATH), exist_ok=True)
+    tmp = CATALOG_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(_catalog, f, indent=1)
+    os.replace(tmp, CATALOG_PATH)
+    _mtime = os.path.getmtime(CATALOG_PATH)
+
+
+def load_all():
+    return _load()
+
+
+def get(video_id):
+    return _load().get(video_id)
+
+
+def record(video_id, entry):
+    _load()[video_id] = entry
+    _save()
+
+
+def new_ingest_id():
+    return uuid.uuid4().hex[:12]
+
+
+def content_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_stat(path):
+    st = os.stat(path)
+    return {"file_size": st.st_size, "file_mtime_ns": st.st_mtime_ns}
+
+
+def check_unchanged(video_id, video_path, params, models):
+    """
+    (unchanged, content_hash) for a video about to be ingested.
+    Unchanged means the catalogue already has this video_id with the same
+    content, ingest params and model versions. Size + mtime matching skips
+    hashing. A video ingested before the catalogue existed is adopted once
+    as-is: its hash, params and models are recorded from then on.
+    """
+    entry = get(video_id)
+    stat = file_stat(video_path)
+    if entry and entry.get("legacy"):
+        entry.update(
+            stat, content_hash=content_hash(video_path), params=params, models=models
+        )
+        del entry["legacy"]
+        _save()
+        return True, entry["content_hash"]
+    if not entry:
+        return False, content_hash(video_path)
+
+    same = entry.get("params") == params and entry.get("models") == models
+    if (
+        entry.get("file_size") == stat["file_size"]
+        and entry.get("file_mtime_ns") == stat["file_mtime_ns"]
+    ):
+        return same, entry.get("content_hash")
+    digest = content_hash(video_path)
+    if entry.get("content_hash") == digest:
+        entry.update(stat)  # touched but identical
+        _save()
+        return same, digest
+    return False, digest
+
+
+def is_live(meta):
+    """Is a metadata row from the current ingest of its video?"""
+    entry = _load().get(meta.get("video_id"))
+    if entry is None:
+        return True
+    return meta.get("ingest_id") == entry.get("ingest_id")
+
+
+def backfill(ranges_by_kind, shot_metas):
+    """Register videos that were indexed before the catalogue existed."""
+    catalog = _load()
+    paths = {}
+    for m in shot_metas:
+        paths.setdefault(m.get("video_id"), m.get("video_path"))
+    changed = False
+    for video_id, ranges in ranges_by_kind.get("shots", {}).items():
+        if video_id in catalog:
+            continue
+        subs = ranges_by_kind.get("subs", {}).get(video_id, [])
+        catalog[video_id] = {
+            "video_id": video_id,
+            "video_path": paths.get(video_id),
+            "legacy": True,
+            "ingest_id": None,
+            "shots": sum(hi - lo for lo, hi in ranges),
+            "subtitle_segments": sum(hi - lo for lo, hi in subs),
+            "id_ranges": {"shots": ranges, "subs": subs},
+            "processed_at": None,
+        }
+        changed = True
+    if changed:
+        _save()
+
+
+def now():
+    return time.strftime("%Y-%m-%dT%H:%M:%S")
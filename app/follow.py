@@ -0,0 +1,110 @@
+import os
+import threading
+
+# Tail-follow ingestion of recordings that are still being written (live
+# events, DVR captures). Each followed video_id gets a thread that polls the
+# file and calls step(video_id) whenever it has grown; the step (see
+# app._follow_step) indexes what lies between the timestamps processed so far,
+# kept in the video's catalogue entry, and the new end of the file.
+POLL_SECONDS = float(os.environ.get("IVS_FOLLOW_POLL_S", "5"))
+# The last detected shot may still be running, so it waits for the next cut,
+# unless it has grown longer than this (a static camera would never cut)
+MAX_PENDING_SECONDS = float(os.environ.get("IVS_FOLLOW_MAX_PENDING_S", "30"))
+
+_followers = {}
+_lock = threading.Lock()
+
+
+def complete_shots(shots, final=False):
+    """
+    (shots that can be indexed now, where detection resumes next time).
+    The trailing shot is held back and detected again next time, unless the
+    recording has ended (final) or it is already MAX_PENDING_SECONDS long.
+    Resume time is None when nothing was detected.
+    """
+    if not shots:
+        return [], None
+    if final or shots[-1][1] - shots[-1][0] > MAX_PENDING_SECONDS:
+        return list(shots), shots[-1][1]
+    return list(shots[:-1]), shots[-1][0]
+
+
+def complete_segments(segments, start, until, final=False):
+    """
+    (subtitle segments that can be indexed now, where ASR resumes next time).
+    Segments running past `until`, the end of the indexed shots, may be cut
+    off mid-sentence, so they are transcribed again next time: ASR resumes at
+    the first of them, or at `until` when none is pending, so that silence
+    and music are not transcribed over and over. Never moves back past start.
+    """
+    if final:
+        return list(segments), max([start, until] + [s["end"] for s in segments])
+    done = [seg for seg in segments if seg["end"] <= until]
+    pending = [seg["start"] for seg in segments if seg["end"] > until]
+    return done, max(start, min(pending + [until]))
+
+
+def _file_state(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class _Follower:
+    def __init__(self, video_id, video_path, step):
+        self.video_id = video_id
+        self.video_path = video_path
+        self.step = step
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run, name=f"follow-{video_id}", daemon=True
+        )
+
+    def _step(self):
+        try:
+            self.step(self.video_id)
+            return True
+        except Exception as e:
+            print(f"Warning: Could not index new part of {self.video_id}: {e}")
+            return False
+
+    def _run(self):
+        seen = None
+        while not self.stopped.is_set():
+            state = _file_state(self.video_path)
+            if state is not None and state != seen and self._step():
+                seen = state
+            self.stopped.wait(POLL_SECONDS)
+
+
+def start(video_id, video_path, step):
+    """Follow video_path; False if video_id is already being followed."""
+    with _lock:
+        follower = _followers.get(video_id)
+        if follower and follower.thread.is_alive():
+            return False
+        follower = _followers[video_id] = _Follower(video_id, video_path, step)
+        follower.thread.start()
+    return True
+
+
+def stop(video_id):
+    """
+    Stop following video_id and wait for its thread (the caller indexes
+    what was held back, once the recording has ended).
+    False if video_id was not being followed.
+    """
+    with _lock:
+        follower = _followers.pop(video_id, None)
+    if follower is None:
+        return False
+    follower.stopped.set()
+    follower.thread.join()
+    return True
+
+
+def is_following(video_id):
+    follower = _followers.get(video_id)
+    return bool(follower and follower.thread.is_alive())
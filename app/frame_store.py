@@ -0,0 +1,187 @@
+import glob
+import os
+import re
+import sys
+
+import numpy as np
+
+DIM = 512
+# Per-frame CLIP embeddings of every indexed shot, as float16 (1 KB/frame).
+# FRAMES_PATH holds the frame rows; TABLE_PATH holds one (first_row, count)
+# int64 pair per shot id, in the same order as the shots FAISS index.
+FRAMES_PATH = os.path.join("../data", "shots_frames.f16")
+TABLE_PATH = os.path.join("../data", "shots_frames.idx")
+# How a shot's frames become one score at search time: "mean" = the pooled
+# vector in the FAISS index, "max" = element-wise max-pooled frame vectors,
+# "top1" = the best single frame
+POOLINGS = ("mean", "max", "top1")
+
+
+class FrameStore:
+    def __init__(self, frames_path, table_path, dim=DIM):
+        self.frames_path = frames_path
+        self.table_path = table_path
+        self.dim = dim
+
+    def _rows(self):
+        if not os.path.exists(self.frames_path):
+            return 0
+        return os.path.getsize(self.frames_path) // (self.dim * 2)
+
+    def __len__(self):
+        """Number of shot ids in the table."""
+        if not os.path.exists(self.table_path):
+            return 0
+        return os.path.getsize(self.table_path) // 16
+
+    def table(self):
+        n = len(self)
+        if n == 0:
+            return np.empty((0, 2), dtype="int64")
+        return np.memmap(self.table_path, dtype="int64", mode="r", shape=(n, 2))
+
+    def frames(self):
+        n = self._rows()
+        if n == 0:
+            return np.empty((0, self.dim), dtype="float16")
+        return np.memmap(
+            self.frames_path, dtype="float16", mode="r", shape=(n, self.dim)
+        )
+
+    def _append_frames(self, frame_sets):
+        """Write frame rows; returns (first_row, count) per frame set."""
+        os.makedirs(os.path.dirname(self.frames_path), exist_ok=True)
+        row = self._rows()
+        entries = []
+        with open(self.frames_path, "ab") as f:
+            for F in frame_sets:
+                F = np.asarray(F, dtype="float32")
+                F = F / np.maximum(np.linalg.norm(F, axis=1, keepdims=True), 1e-12)
+                f.write(F.astype("float16").tobytes())
+                entries.append((row, len(F)))
+                row += len(F)
+        return entries
+
+    def _pad_table(self, n):
+        """Extend the table to n shot ids; new ids get zero frames."""
+        missing = n - len(self)
+        if missing > 0:
+            with open(self.table_path, "ab") as f:
+                f.write(np.tile([self._rows(), 0], missing).astype("int64").tobytes())
+
+    def add_shots(self, first_id, frame_sets):
+        """
+        Append frames for shots first_id, first_id + 1, ... Shot ids before
+        first_id that have no entry yet (older data) get zero frames.
+        frame_sets: one (n_frames, dim) array per shot.
+        """
+        self._pad_table(first_id)
+        entries = self._append_frames(frame_sets)
+        with open(self.table_path, "ab") as f:
+            f.write(np.asarray(entries, dtype="int64").reshape(-1, 2).tobytes())
+
+    def set_shots(self, frames_by_id):
+        """Store frames for existing shot ids ({shot_id: frames}), e.g. a backfill."""
+        if not frames_by_id:
+            return
+        ids = list(frames_by_id)
+        self._pad_table(max(ids) + 1)
+        entries = self._append_frames(frames_by_id[i] for i in ids)
+        table = np.memmap(
+            self.table_path, dtype="int64", mode="r+", shape=(len(self), 2)
+        )
+        table[ids] = entries
+        table.flush()
+        del table
+
+    def gather(self, shot_ids):
+        """
+        Frames of the given shots as float32 (rows, dim), plus the segment
+        start offsets and counts per shot, for np.*.reduceat scoring.
+        """
+        shot_ids = np.asarray(shot_ids, dtype="int64")
+        table = self.table()
+        counts = np.zeros(len(shot_ids), dtype="int64")
+        firsts = np.zeros(len(shot_ids), dtype="int64")
+        known = (shot_ids >= 0) & (shot_ids < len(table))
+        firsts[known] = table[shot_ids[known], 0]
+        counts[known] = table[shot_ids[known], 1]
+        rows = np.repeat(firsts, counts) + (
+            np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        )
+        X = np.asarray(self.frames()[rows], dtype="float32") if len(rows) else None
+        offsets = np.cumsum(counts) - counts
+        return X, offsets, counts
+
+
+frames = FrameStore(FRAMES_PATH, TABLE_PATH)
+
+
+def pooled_scores(qvec, shot_ids, fallback, pooling="top1"):
+    """
+    Query similarity per shot with its frames pooled as `pooling`, vectorized
+    over all candidate shots. Shots without stored frames keep their fallback
+    score (the similarity of the mean-pooled vector in the index).
+    """
+    out = np.asarray(fallback, dtype="float32").copy()
+    X, offsets, counts = frames.gather(shot_ids)
+    if X is None:
+        return out
+    q = np.asarray(qvec, dtype="float32")
+    q = q / max(np.linalg.norm(q), 1e-12)
+    has = counts > 0
+    if pooling == "max":
+        P = np.maximum.reduceat(X, offsets[has], axis=0)
+        P /= np.maximum(np.linalg.norm(P, axis=1, keepdims=True), 1e-12)
+        out[has] = P @ q
+        return out
+    sims = X @ q
+    if pooling == "top1":
+        out[has] = np.maximum.reduceat(sims, offsets[has])
+    else:
+        P = np.add.reduceat(X, offsets[has], axis=0)
+        P /= np.maximum(np.linalg.norm(P, axis=1, keepdims=True), 1e-12)
+        out[has] = P @ q
+    return out
+
+
+def _frame_files(thumb_rel):
+    """Frame JPGs of a shot, from its representative thumbnail's name."""
+    prefix = os.path.join("../data", thumb_rel).rsplit("_frame", 1)[0]
+    paths = glob.glob(glob.escape(prefix) + "_frame*.jpg")
+    return sorted(paths, key=lambda p: int(re.search(r"_frame(\d+)", p).group(1)))
+
+
+def backfill(metas, embed_images, batch_size=256):
+    """
+    Embed the frame JPGs still on disk for shots indexed before frames were
+    stored. metas are the shots' metadata rows, in index id order.
+    Returns the number of shots filled in.
+    """
+    from PIL import Image
+
+    table = frames.table()
+    todo = [i for i in range(len(metas)) if i >= len(table) or table[i, 1] == 0]
+    del table
+    filled = 0
+    for lo in range(0, len(todo), batch_size):
+        batch = {}
+        for i in todo[lo : lo + batch_size]:
+            paths = _frame_files(metas[i]["thumb_rel"])
+            if paths:
+                images = [Image.open(p).convert("RGB") for p in paths]
+                batch[i] = embed_images(images)
+        frames.set_shots(batch)
+        filled += len(batch)
+    return filled
+
+
+if __name__ == "__main__":
+    # Usage: python frame_store.py backfill   (run from app/)
+    if sys.argv[1:] != ["backfill"]:
+        sys.exit("usage: python frame_store.py backfill")
+    from models import embed_images
+    from store import load_all
+
+    metas = load_all()
+    print(f"Stored frames for {backfill(metas, embed_images)} of {len(metas)} shots")
@@ -0,0 +1,199 @@
+import json
+import os
+
+import numpy as np
+
+# video_id → contiguous id ranges [lo, hi) in each FAISS index, so filtered
+# searches only touch the vectors of the requested videos.
+# {"shots": {video_id: [[lo, hi], ...]}, "subs": {...}, "scenes": {...},
+#  "videos": {...}, "retired": {"shots": [[lo, hi], ...], "subs": [...], ...}}
+# Retired ranges belong to a previous ingest of a reprocessed video; their
+# vectors stay in FAISS but are excluded from search.
+RANGES_PATH = os.path.join("../data", "id_ranges.json")
+KINDS = ("shots", "subs", "scenes", "videos")
+
+_ranges = None
+_mtime = None
+
+
+def _load():
+    global _ranges, _mtime
+    mtime = os.path.getmtime(RANGES_PATH) if os.path.exists(RANGES_PATH) else None
+    if _ranges is None or mtime != _mtime:
+        if mtime is None:
+            _ranges = {}
+        else:
+            with open(RANGES_PATH) as f:
+                _ranges = json.load(f)
+        retired = _ranges.setdefault("retired", {})
+        for kind in KINDS:
+            _ranges.setdefault(kind, {})
+            retired.setdefault(kind, [])
+        _mtime = mtime
+    return _ranges
+
+
+def _save():
+    os.makedirs(os.path.dirname(RANGES_PATH), exist_ok=True)
+    tmp = RANGES_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(_ranges, f)
+    os.replace(tmp, RANGES_PATH)
+
+
+def add_range(kind, video_id, lo, hi):
+    """Record that ids [lo, hi) of index `kind` belong to video_id."""
+    global _mtime
+    if hi <= lo:
+        return
+    ranges = _load()[kind].setdefault(video_id, [])
+    if ranges and ranges[-1][1] == lo:
+        ranges[-1][1] = hi
+    else:
+        ranges.append([lo, hi])
+    _save()
+    _mtime = os.path.getmtime(RANGES_PATH)
+
+
+def retire(kind, video_id):
+    """Stop searching the ids of a video's previous ingest."""
+    global _mtime
+    ranges = _load()[kind].pop(video_id, [])
+    if ranges:
+        _ranges["retired"][kind].extend(ranges)
+        _save()
+        _mtime = os.path.getmtime(RANGES_PATH)
+    return ranges
+
+
+def retire_last(kind, video_id):
+    """Retire the last id of a video (a row being replaced); None if it has none."""
+    global _mtime
+    ranges = _load()[kind].get(video_id)
+    if not ranges:
+        return None
+    last = ranges[-1][1] - 1
+    ranges[-1][1] = last
+    if ranges[-1][0] == last:
+        ranges.pop()
+    if not ranges:
+        del _ranges[kind][video_id]
+    _ranges["retired"][kind].append([last, last + 1])
+    _save()
+    _mtime = os.path.getmtime(RANGES_PATH)
+    return last
+
+
+def reset(kind):
+    """Forget every range of `kind`, live and retired (its index was removed)."""
+    global _mtime
+    _load()[kind] = {}
+    _ranges["retired"][kind] = []
+    _save()
+    _mtime = os.path.getmtime(RANGES_PATH)
+
+
+def restore(kind, video_id, ranges):
+    """Undo retire(): make the given ranges of video_id searchable again."""
+    global _mtime
+    ranges = [list(r) for r in ranges]
+    if not ranges:
+        return
+    retired = _load()["retired"]
+    retired[kind] = [r for r in retired[kind] if r not in ranges]
+    live = _ranges[kind].setdefault(video_id, [])
+    live[:] = sorted(live + ranges)
+    _save()
+    _mtime = os.path.getmtime(RANGES_PATH)
+
+
+def retired_ids(kind):
+    parts = [np.arange(lo, hi, dtype="int64") for lo, hi in _load()["retired"][kind]]
+    return np.concatenate(parts) if parts else np.empty(0, dtype="int64")
+
+
+def all_ranges():
+    return _load()
+
+
+def get_ranges(kind, video_id):
+    return [tuple(r) for r in _load()[kind].get(video_id, [])]
+
+
+def video_ids(kind):
+    return list(_load()[kind].keys())
+
+
+def rebuild_from_meta(kind, metas):
+    """Recreate the ranges of `kind` from its positional metadata list."""
+    global _mtime
+    ranges = {}
+    for i, m in enumerate(metas):
+        r = ranges.setdefault(m.get("video_id", ""), [])
+        if r and r[-1][1] == i:
+            r[-1][1] = i + 1
+        else:
+            r.append([i, i + 1])
+    _load()[kind] = ranges
+    _save()
+    _mtime = os.path.getmtime(RANGES_PATH)
+
+
+_times = {}
+
+
+def _time_arrays(kind, metas):
+    """
+    (starts, ends) of every row of the positional metadata list, as arrays.
+    Metadata is append-only, so the cached arrays are only extended; they
+    are rebuilt when the rows they cover no longer match (index replaced).
+    """
+    n, last, starts, ends = _times.get(kind, (0, None, None, None))
+    if n > len(metas) or (n and metas[n - 1] != last):
+        n, starts, ends = 0, None, None
+    if n < len(metas) or starts is None:
+        new = metas[n:]
+        starts = np.concatenate(
+            ([] if starts is None else [starts])
+            + [np.fromiter((m.get("start", 0.0) for m in new), "float64", len(new))]
+        )
+        ends = np.concatenate(
+            ([] if ends is None else [ends])
+            + [np.fromiter((m.get("end", 0.0) for m in new), "float64", len(new))]
+        )
+        n = len(metas)
+        _times[kind] = (n, metas[n - 1] if n else None, starts, ends)
+    return starts, ends
+
+
+def select_ids(kind, metas, videos=None, start_time=None, end_time=None, extra=()):
+    """
+    Ids of `kind` matching the filters, as a sorted int64 array.
+    videos: list of video_ids (None = all). Times filter on overlap with
+    [start_time, end_time] using the positional metadata list.
+    extra: ids always included (e.g. canonical ids of matching duplicates).
+    """
+    if videos is None:
+        ids = np.setdiff1d(
+            np.arange(len(metas), dtype="int64"), retired_ids(kind), assume_unique=True
+        )
+    else:
+        parts = [
+            np.arange(lo, hi, dtype="int64")
+            for v in videos
+            for lo, hi in get_ranges(kind, v)
+        ]
+        # Videos are listed in any order: sort (and dedupe) like the docstring says
+        ids = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype="int64")
+    if start_time is not None or end_time is not None:
+        starts, ends = _time_arrays(kind, metas)
+        ids = ids[ids < len(metas)]
+        keep = np.ones(len(ids), dtype=bool)
+        if start_time is not None:
+            keep &= ends[ids] >= start_time
+        if end_time is not None:
+            keep &= starts[ids] <= end_time
+        ids = ids[keep]
+    if len(extra):
+        ids = np.union1d(ids, np.asarray(extra, dtype="int64"))
+    return ids
@@ -2,31 +2,116 @@ import os
 
 import faiss
 import numpy as np
+import serving
+import vector_store
 
-DIM = 512
+DIM = vector_store.DIM
 INDEX_PATH = os.path.join("../data", "shots.faiss")
-index = faiss.IndexFlatIP(DIM)
+VECTORS_PATH = os.path.join("../data", "shots_vectors.f32")
+index = vector_store.make_index()
+vectors = vector_store.VectorFile(VECTORS_PATH, DIM)
 
 
-def load_index():
+def load_index(path=INDEX_PATH, read_only=False):
+    """read_only maps a published generation (search-only workers)."""
     global index
-    if os.path.exists(INDEX_PATH):
-        index = faiss.read_index(INDEX_PATH)
+    if not os.path.exists(path):
+        return
+    if read_only:
+        index = serving.read_index_mmap(path)
+    else:
+        index = faiss.read_index(path)
+        vector_store.backfill(index, vectors)
+        converted = vector_store.convert(index, vectors)
+        if converted is not index:
+            index = converted
+            save_index()
 
 
 def save_index():
     os.makedirs("../data", exist_ok=True)
-    faiss.write_index(index, INDEX_PATH)
+    # Write then rename, so published generations never see a partial file
+    faiss.write_index(index, INDEX_PATH + ".tmp")
+    os.replace(INDEX_PATH + ".tmp", INDEX_PATH)
 
 
-def add_vectors(vectors):
-    X = np.asarray(vectors, dtype="float32")
+def add_vectors(vectors_in):
+    """Add vectors; returns the range of index ids they were given."""
+    global index
+    X = np.asarray(vectors_in, dtype="float32")
     faiss.normalize_L2(X)
-    index.add(X)
+    base = len(vectors)
+    index = vector_store.add(index, vectors, X)
+    return range(base, base + len(X))
+
+
+def add_vectors_dedup(vectors_in, threshold=0.97, exclude=None):
+    """
+    Add vectors, skipping near-duplicates of existing or earlier vectors.
+    Returns list of (index_id, is_duplicate), one per input vector. For a
+    duplicate, index_id is the canonical vector it was matched to.
+    exclude: ids never used as canonical (retired ingests).
+    """
+    global index
+    X = np.asarray(vectors_in, dtype="float32")
+    faiss.normalize_L2(X)
+    if len(X) == 0:
+        return []
+
+    # Best match for every new vector among vectors already in the index
+    base = len(vectors)
+    if base > 0:
+        params = vector_store.exclude_params(exclude)
+        D, labels = vector_store.search(index, vectors, X, 1, params=params)
+        best_ids, best_scores = labels[:, 0], D[:, 0]
+    else:
+        best_ids = np.full(len(X), -1)
+        best_scores = np.full(len(X), -np.inf)
+
+    keep = []  # rows of X that become new index entries
+    out = []
+    for row in range(len(X)):
+        cid, score = int(best_ids[row]), float(best_scores[row])
+        # Also compare against vectors accepted earlier in this batch
+        if keep:
+            sims = X[keep] @ X[row]
+            j = int(np.argmax(sims))
+            if sims[j] > score:
+                cid, score = base + j, float(sims[j])
+        if cid >= 0 and score >= threshold:
+            out.append((cid, True))
+        else:
+            out.append((base + len(keep), False))
+            keep.append(row)
 
+    if keep:
+        index = vector_store.add(index, vectors, X[keep])
+    return out
 
-def search_vector(vec, k=8):
-    Q = np.asarray([vec], dtype="float32")
+
+def search_vectors(vecs, k=8, ids=None, exclude=None):
+    """
+    Batched top-k: returns (distances, indices) arrays, one row per query.
+    ids restricts the search to those ids; exclude skips those ids.
+    """
+    Q = np.array(vecs, dtype="float32", ndmin=2)
     faiss.normalize_L2(Q)
-    distances, indices = index.search(Q, k)
+    if ids is not None:
+        return vector_store.search_ids(index, vectors, Q, ids, k)
+    params = vector_store.exclude_params(exclude)
+    return vector_store.search(index, vectors, Q, k, params=params)
+
+
+def search_vector(vec, k=8, ids=None, exclude=None):
+    """Top-k shots for vec; ids restricts the search to those index ids."""
+    distances, indices = search_vectors([vec], k, ids, exclude)
     return indices[0].tolist(), distances[0].tolist()
+
+
+def score_ids(vec, ids):
+    """Exact cosine similarity of vec with each of the given ids (-1 → -inf)."""
+    Q = np.array(vec, dtype="float32", ndmin=2)
+    faiss.normalize_L2(Q)
+    ids = np.asarray(ids, dtype="int64")
+    ids = np.where(ids < len(vectors), ids, -1)
+    return vector_store.exact_scores(vectors, Q, ids[None, :])[0]
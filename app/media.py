@@ -0,0 +1,154 @@
+import os
+import re
+
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+from PIL import Image, features
+
+DATA_DIR = "../data"
+SIZED_DIR = os.path.join(DATA_DIR, "thumbs_sized")
+
+THUMB_WIDTHS = (160, 320, 640)
+# WebP is ~30% smaller than JPEG at the same quality, when Pillow has it
+THUMB_EXT = "webp" if features.check("webp") else "jpg"
+
+CHUNK_SIZE = 256 * 1024
+# Resized thumbnails are stored under the ingest that made them, so a given
+# URL never changes. Full-size thumbnails and videos are overwritten when a
+# video is reprocessed or replaced, so they revalidate.
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=3600"
+
+_CONTENT_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+    ".png": "image/png",
+    ".json": "application/json",
+    ".mp4": "video/mp4",
+    ".mov": "video/quicktime",
+    ".mkv": "video/x-matroska",
+    ".webm": "video/webm",
+}
+
+
+def _save(img, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if THUMB_EXT == "webp":
+        img.save(path, "WEBP", quality=80, method=4)
+    else:
+        img.save(path, "JPEG", quality=82, optimize=True, progressive=True)
+
+
+def make_thumbnails(src_path, ingest_id):
+    """
+    Resized copies of a thumbnail, one per THUMB_WIDTHS, under the ingest id
+    (reprocessing a video writes new files instead of changing cached ones).
+    Returns {width: path relative to DATA_DIR}.
+    """
+    stem = os.path.splitext(os.path.basename(src_path))[0]
+    out = {}
+    with Image.open(src_path) as img:
+        img = img.convert("RGB")
+        for w in THUMB_WIDTHS:
+            path = os.path.join(SIZED_DIR, str(w), ingest_id, f"{stem}.{THUMB_EXT}")
+            if not os.path.exists(path):
+                h = max(1, round(img.height * w / img.width))
+                _save(img.resize((w, h), Image.LANCZOS), path)
+            out[w] = os.path.relpath(path, DATA_DIR)
+    return out
+
+
+def _resolve(rel_path):
+    """Absolute path of rel_path inside DATA_DIR; 404 for anything outside."""
+    root = os.path.realpath(DATA_DIR)
+    path = os.path.realpath(os.path.join(root, rel_path))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Not found")
+    return path
+
+
+def _is_versioned(rel_path):
+    """thumbs_sized/<width>/<ingest id>/<name>, written once."""
+    parts = rel_path.split("/")
+    return len(parts) == 4 and parts[0] == "thumbs_sized"
+
+
+def _etag(st):
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def _parse_range(header, size):
+    """(start, end) inclusive for a single "bytes=" range, or None if absent."""
+    m = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    if m.group(1):
+        start = int(m.group(1))
+        end = int(m.group(2)) if m.group(2) else size - 1
+    else:  # suffix range: last N bytes
+        start = max(0, size - int(m.group(2)))
+        end = size - 1
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416, headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, min(end, size - 1)
+
+
+def _iter_file(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve(rel_path, request):
+    """
+    Serve a file under DATA_DIR with ETag / Cache-Control, 304 on a matching
+    If-None-Match, and single HTTP Range requests (206) for video seeking.
+    """
+    path = _resolve(rel_path)
+    st = os.stat(path)
+    ext = os.path.splitext(path)[1].lower()
+    etag = _etag(st)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE if _is_versioned(rel_path) else REVALIDATE,
+        "Accept-Ranges": "bytes",
+    }
+    media_type = _CONTENT_TYPES.get(ext, "application/octet-stream")
+
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    rng = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        rng = _parse_range(range_header, st.st_size)
+
+    if rng is None:
+        headers["Content-Length"] = str(st.st_size)
+        if request.method == "HEAD":
+            return Response(headers=headers, media_type=media_type)
+        return StreamingResponse(
+            _iter_file(path, 0, st.st_size), headers=headers, media_type=media_type
+        )
+
+    start, end = rng
+    length = end - start + 1
+    headers["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+    headers["Content-Length"] = str(length)
+    if request.method == "HEAD":
+        return Response(status_code=206, headers=headers, media_type=media_type)
+    return StreamingResponse(
+        _iter_file(path, start, length),
+        status_code=206,
+        headers=headers,
+        media_type=media_type,
+    )
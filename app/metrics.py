@@ -0,0 +1,112 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond searches to long ingests
+BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+    math.inf,
+)
+
+
+RECENT_SECONDS = 60  # window for recent_quantile()
+RECENT_MAX = 10000  # observations kept per stage within the window
+
+
+class Histogram:
+    """Prometheus-style histogram with a single "stage" label."""
+
+    def __init__(self, name, help_text, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # stage -> [bucket counts..., sum, count]
+        self._series = {}
+        # stage -> deque of (wall time, seconds) for the last RECENT_SECONDS
+        self._recent = {}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            s = self._series.setdefault(stage, [0] * len(self.buckets) + [0.0, 0])
+            for i, le in enumerate(self.buckets):
+                if seconds <= le:
+                    s[i] += 1
+            s[-2] += seconds
+            s[-1] += 1
+            self._recent.setdefault(stage, deque(maxlen=RECENT_MAX)).append(
+                (time.time(), seconds)
+            )
+
+    def recent_quantile(self, stage, q):
+        """q-quantile of a stage over the last RECENT_SECONDS, or None."""
+        cutoff = time.time() - RECENT_SECONDS
+        with self._lock:
+            recent = self._recent.get(stage, ())
+            while recent and recent[0][0] < cutoff:
+                recent.popleft()
+            values = sorted(seconds for _, seconds in recent)
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            for stage, s in sorted(self._series.items()):
+                for le, n in zip(self.buckets, s):
+                    le_str = "+Inf" if le == math.inf else repr(le)
+                    lines.append(
+                        f'{self.name}_bucket{{stage="{stage}",le="{le_str}"}} {n}'
+                    )
+                lines.append(f'{self.name}_sum{{stage="{stage}"}} {s[-2]}')
+                lines.append(f'{self.name}_count{{stage="{stage}"}} {s[-1]}')
+        return "\n".join(lines)
+
+
+SEARCH = Histogram("ivs_search_stage_seconds", "Time spent per /search stage")
+INGEST = Histogram("ivs_ingest_stage_seconds", "Time spent per /process_video stage")
+
+
+class Timings(dict):
+    """Per-request stage timings; a stage may be entered many times."""
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self[name] = self.get(name, 0.0) + time.perf_counter() - start
+
+    def observe(self, histogram):
+        for name, seconds in self.items():
+            histogram.observe(name, seconds)
+
+    def rounded(self, ndigits=4):
+        return {name: round(seconds, ndigits) for name, seconds in self.items()}
+
+
+def render():
+    """All metrics in Prometheus text exposition format."""
+    return "\n".join(h.render() for h in (SEARCH, INGEST)) + "\n"
@@ -0,0 +1,121 @@
+import os
+import re
+
+import numpy as np
+from frame_store import pooled_scores
+from id_ranges import get_ranges
+from index import score_ids as score_shots
+from subs_index import score_ids as score_subs
+
+# Two-stage search: the first stage fetches CANDIDATES hits per index, the
+# second re-scores them with the features below. Each feature is min-max
+# normalized over the candidates, then weighted.
+CANDIDATES = int(os.environ.get("IVS_RERANK_CANDIDATES", "100"))
+SHOT_WEIGHTS = {"pooled": 0.3, "frame": 0.4, "neighbour": 0.15, "keyword": 0.15}
+SUB_WEIGHTS = {"similarity": 0.6, "neighbour": 0.2, "keyword": 0.2}
+
+STOPWORDS = {
+    "a", "an", "and", "are", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "the", "this", "that", "to", "was", "with",
+}  # fmt: skip
+
+
+def _tokens(text):
+    return {t for t in re.findall(r"\w+", (text or "").lower()) if t not in STOPWORDS}
+
+
+def _minmax(x):
+    x = np.asarray(x, dtype="float32")
+    if len(x) == 0:
+        return x
+    lo, hi = x.min(), x.max()
+    if hi - lo < 1e-8:
+        return np.zeros_like(x)
+    return (x - lo) / (hi - lo)
+
+
+def _combine(features, weights):
+    return sum(w * _minmax(features[name]) for name, w in weights.items())
+
+
+def _keyword_overlap(query_tokens, text):
+    if not query_tokens:
+        return 0.0
+    return len(query_tokens & _tokens(text)) / len(query_tokens)
+
+
+def _neighbour_scores(qvec, ids, scores, metas, score_fn):
+    """
+    Mean similarity of the previous and next entry of the same ingest of the
+    same video: a hit whose neighbours also match is less likely a fluke.
+    Entries without neighbours keep their own score.
+    """
+    ids = np.asarray(ids, dtype="int64")
+    neighbours = np.stack([ids - 1, ids + 1], axis=1)
+    for row, i in enumerate(ids):
+        for col, j in enumerate(neighbours[row]):
+            if not (0 <= j < len(metas)) or (
+                metas[j].get("video_id"),
+                metas[j].get("ingest_id"),
+            ) != (metas[i].get("video_id"), metas[i].get("ingest_id")):
+                neighbours[row, col] = -1
+    sims = score_fn(qvec, neighbours.ravel()).reshape(neighbours.shape)
+    valid = np.isfinite(sims)
+    own = np.asarray(scores, dtype="float32")
+    total = np.where(valid, sims, 0.0).sum(axis=1)
+    count = valid.sum(axis=1)
+    return np.where(count > 0, total / np.maximum(count, 1), own)
+
+
+def _spoken_text(m, subs_meta, cache):
+    """Subtitle text overlapping a shot's time span."""
+    video_id = m.get("video_id")
+    if video_id not in cache:
+        cache[video_id] = [
+            subs_meta[j]
+            for lo, hi in get_ranges("subs", video_id)
+            for j in range(lo, min(hi, len(subs_meta)))
+        ]
+    return " ".join(
+        s.get("text", "")
+        for s in cache[video_id]
+        if s.get("end", 0.0) >= m.get("start", 0.0)
+        and s.get("start", 0.0) <= m.get("end", 0.0)
+    )
+
+
+def rerank_shots(query, qvec, ids, scores, img_meta, subs_meta):
+    """New scores for shot candidates (ids, first-stage scores)."""
+    hits = [(i, s) for i, s in zip(ids, scores) if 0 <= i < len(img_meta)]
+    if not hits:
+        return [], []
+    ids = [i for i, _ in hits]
+    scores = np.asarray([s for _, s in hits], dtype="float32")
+    query_tokens = _tokens(query)
+    spoken = {}
+    features = {
+        "pooled": scores,
+        "frame": pooled_scores(qvec, ids, scores, "top1"),
+        "neighbour": _neighbour_scores(qvec, ids, scores, img_meta, score_shots),
+        "keyword": [
+            _keyword_overlap(query_tokens, _spoken_text(img_meta[i], subs_meta, spoken))
+            for i in ids
+        ],
+    }
+    return ids, _combine(features, SHOT_WEIGHTS).tolist()
+
+
+def rerank_subs(query, qvec, ids, scores, subs_meta):
+    """New scores for subtitle candidates (ids, first-stage scores)."""
+    hits = [(i, s) for i, s in zip(ids, scores) if 0 <= i < len(subs_meta)]
+    if not hits:
+        return [], []
+    ids = [i for i, _ in hits]
+    scores = np.asarray([s for _, s in hits], dtype="float32")
+    query_tokens = _tokens(query)
+    features = {
+        "similarity": scores,
+        "neighbour": _neighbour_scores(qvec, ids, scores, subs_meta, score_subs),
+        "keyword": [_keyword_overlap(query_tokens, subs_meta[i]["text"]) for i in ids],
+    }
+    return ids, _combine(features, SUB_WEIGHTS).tolist()
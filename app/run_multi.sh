@@ -0,0 +1,22 @@
+#!/usr/bin/env bash
+# One index writer + N search-only workers.
+#   writer  (port 8001): the only process that ingests; after each video it
+#                        publishes a new index generation
+#   readers (port 8000): map the latest generation read-only (shared page
+#                        cache) and reload when the GENERATION counter moves
+# Point the UI's ingestion at the writer: IVS_INGEST_API=http://localhost:8001
+set -e
+cd "$(dirname "$0")"
+source ../.venv313/bin/activate
+export TOKENIZERS_PARALLELISM=false
+
+WORKERS=${IVS_WORKERS:-4}
+# Each reader gets one BLAS/OpenMP thread, so N readers use N cores
+READER_THREADS=${IVS_READER_THREADS:-1}
+
+# Kill any existing gunicorn processes
+pkill -f gunicorn || true
+
+IVS_ROLE=writer gunicorn -w 1 -k uvicorn.workers.UvicornWorker app:app --bind 0.0.0.0:8001 --timeout 500 &
+
+exec env IVS_ROLE=reader OMP_NUM_THREADS="$READER_THREADS" gunicorn -w "$WORKERS" -k uvicorn.workers.UvicornWorker app:app --bind 0.0.0.0:8000 --timeout 500
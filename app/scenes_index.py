@@ -0,0 +1,277 @@
+import json
+import os
+import sys
+
+import catalog
+import faiss
+import id_ranges
+import index as img_index
+import numpy as np
+import serving
+import subs_index
+import vector_store
+from store import load_all, load_duplicates, read_jsonl
+
+# Summary level above shots and subtitle segments, for coarse-to-fine search:
+#   video → scenes → shots / segments
+# A scene is a run of consecutive shots of one video; its vector pools the
+# shot vectors and the subtitle vectors spoken during it. A video's vector
+# pools its scenes. Children are stored as index ids, so a search can be
+# restricted to the shots and segments under the best scenes.
+DIM = vector_store.DIM
+INDEX_PATH = os.path.join("../data", "scenes.faiss")
+META_PATH = os.path.join("../data", "scenes_meta.jsonl")
+VECTORS_PATH = os.path.join("../data", "scenes_vectors.f32")
+VIDEOS_META_PATH = os.path.join("../data", "videos_meta.jsonl")
+VIDEOS_VECTORS_PATH = os.path.join("../data", "videos_vectors.f32")
+
+# A new scene starts where consecutive shots are less similar than
+# SCENE_SPLIT, or where the scene would grow past SCENE_MAX_SECONDS
+SCENE_SPLIT = float(os.environ.get("IVS_SCENE_SPLIT", "0.8"))
+SCENE_MAX_SECONDS = float(os.environ.get("IVS_SCENE_MAX_SECONDS", "120"))
+# Libraries with more live videos than this pick the top videos first
+TOP_VIDEOS = int(os.environ.get("IVS_SCENE_TOP_VIDEOS", "20"))
+
+scenes_index = vector_store.make_index()
+vectors = vector_store.VectorFile(VECTORS_PATH, DIM)
+video_vectors = vector_store.VectorFile(VIDEOS_VECTORS_PATH, DIM)
+
+
+def _normalize(X):
+    faiss.normalize_L2(X)
+    return X
+
+
+def _unit(v):
+    return v / max(float(np.linalg.norm(v)), 1e-12)
+
+
+def load_index(path=INDEX_PATH, read_only=False):
+    """read_only maps a published generation (search-only workers)."""
+    global scenes_index
+    if not os.path.exists(path):
+        return
+    if read_only:
+        scenes_index = serving.read_index_mmap(path)
+    else:
+        scenes_index = faiss.read_index(path)
+        vector_store.backfill(scenes_index, vectors)
+        converted = vector_store.convert(scenes_index, vectors)
+        if converted is not scenes_index:
+            scenes_index = converted
+            save_index()
+
+
+def save_index():
+    os.makedirs("../data", exist_ok=True)
+    # Write then rename, so published generations never see a partial file
+    faiss.write_index(scenes_index, INDEX_PATH + ".tmp")
+    os.replace(INDEX_PATH + ".tmp", INDEX_PATH)
+
+
+def _append_meta(path, metas):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        for m in metas:
+            f.write(json.dumps(m) + "\n")
+
+
+def load_meta_all():
+    return read_jsonl(META_PATH)
+
+
+def load_video_meta_all():
+    return read_jsonl(VIDEOS_META_PATH)
+
+
+def segment(shot_metas, X):
+    """[lo, hi) positions of the scenes of a video's shots (in time order)."""
+    bounds = []
+    lo = 0
+    for i in range(1, len(shot_metas)):
+        too_long = shot_metas[i]["end"] - shot_metas[lo]["start"] > SCENE_MAX_SECONDS
+        if too_long or float(X[i] @ X[i - 1]) < SCENE_SPLIT:
+            bounds.append((lo, i))
+            lo = i
+    if shot_metas:
+        bounds.append((lo, len(shot_metas)))
+    return bounds
+
+
+def _pool(shot_X, sub_X):
+    """Scene vector: mean shot vector, plus mean subtitle vector if any."""
+    v = _unit(shot_X.mean(axis=0)) if len(shot_X) else np.zeros(DIM, "float32")
+    if len(sub_X):
+        v = _unit(v + _unit(sub_X.mean(axis=0)))
+    return v
+
+
+def _sub_vectors(ids):
+    if not ids:
+        return np.empty((0, DIM), dtype="float32")
+    return np.asarray(subs_index.vectors.view()[ids])
+
+
+def _segment_scenes(video_id, ingest_id, shots, subs):
+    shot_X = np.asarray(img_index.vectors.view()[[i for i, _ in shots]])
+    sub_X = _sub_vectors([i for i, _ in subs])
+    shot_metas = [m for _, m in shots]
+    sub_mids = np.array([(m["start"] + m["end"]) / 2 for _, m in subs])
+
+    bounds = segment(shot_metas, shot_X)
+    scene_X, scene_metas = [], []
+    for n, (lo, hi) in enumerate(bounds):
+        # Scenes tile the video: subtitles between two scenes go to the later
+        start = shot_metas[lo]["start"] if n else 0.0
+        end = shot_metas[hi - 1]["end"] if n < len(bounds) - 1 else np.inf
+        in_scene = np.flatnonzero((sub_mids >= start) & (sub_mids < end))
+        scene_X.append(_pool(shot_X[lo:hi], sub_X[in_scene]))
+        scene_metas.append(
+            {
+                "video_id": video_id,
+                "ingest_id": ingest_id,
+                "start": shot_metas[lo]["start"],
+                "end": shot_metas[hi - 1]["end"],
+                "shot_ids": [i for i, _ in shots[lo:hi]],
+                "sub_ids": [subs[j][0] for j in in_scene],
+            }
+        )
+    return scene_X, scene_metas
+
+
+def _extend_last_scene(video_id, ingest_id, subs):
+    """
+    Subtitles of a pass without shots (a followed recording on one long
+    shot) join the video's last scene, which is replaced by a re-pooled
+    copy; speech before any shot gets a scene of its own.
+    Returns (vectors, metas, number of scenes added).
+    """
+    last = id_ranges.retire_last("scenes", video_id)
+    if last is None:
+        meta = {
+            "video_id": video_id,
+            "ingest_id": ingest_id,
+            "start": subs[0][1]["start"],
+            "end": subs[-1][1]["end"],
+            "shot_ids": [],
+            "sub_ids": [],
+        }
+    else:
+        meta = dict(load_meta_all()[last])
+    meta["sub_ids"] = meta["sub_ids"] + [i for i, _ in subs]
+    meta["end"] = max(meta["end"], subs[-1][1]["end"])
+    shot_X = np.asarray(img_index.vectors.view()[meta["shot_ids"]])
+    v = _pool(shot_X, _sub_vectors(meta["sub_ids"]))
+    return [v], [meta], int(last is None)
+
+
+def _pool_video(video_id, ingest_id):
+    """Replace the video's entry with one pooling all of its live scenes."""
+    id_ranges.retire("videos", video_id)
+    ranges = id_ranges.get_ranges("scenes", video_id)
+    ids = [i for lo, hi in ranges for i in range(lo, hi)]
+    if not ids:
+        return
+    row = len(video_vectors)
+    V = np.asarray(vectors.view()[ids])
+    video_vectors.append(_normalize(V.mean(axis=0, keepdims=True)))
+    _append_meta(
+        VIDEOS_META_PATH,
+        [
+            {
+                "video_id": video_id,
+                "ingest_id": ingest_id,
+                "scenes": [list(r) for r in ranges],
+            }
+        ],
+    )
+    id_ranges.add_range("videos", video_id, row, row + 1)
+
+
+def build(video_id, ingest_id, shots, subs):
+    """
+    Add the scenes of one ingest (or indexing pass of a followed recording)
+    and re-pool the video's entry.
+    shots: [(shot index id, meta)] in time order (a duplicate shot uses its
+    canonical id); subs: [(segment index id, meta)].
+    Returns the number of scenes added.
+    """
+    global scenes_index
+    if shots:
+        scene_X, scene_metas = _segment_scenes(video_id, ingest_id, shots, subs)
+        added = len(scene_metas)
+    elif subs:
+        scene_X, scene_metas, added = _extend_last_scene(video_id, ingest_id, subs)
+    else:
+        return 0
+
+    X = _normalize(np.asarray(scene_X, dtype="float32"))
+    base = len(vectors)
+    scenes_index = vector_store.add(scenes_index, vectors, X)
+    _append_meta(META_PATH, scene_metas)
+    id_ranges.add_range("scenes", video_id, base, base + len(X))
+    _pool_video(video_id, ingest_id)
+    return added
+
+
+def search_videos(vec, n, exclude=None):
+    """
+    Top-n video rows for vec (exact scan: one live row per video, re-pooled
+    after each ingest or indexing pass).
+    """
+    V = video_vectors.view()
+    if len(V) == 0:
+        return []
+    scores = np.asarray(V @ _unit(np.asarray(vec, dtype="float32")))
+    if exclude is not None and len(exclude):
+        scores[np.asarray(exclude, dtype="int64")] = -np.inf
+    top = np.argsort(-scores)[:n]
+    return [int(i) for i in top if np.isfinite(scores[i])]
+
+
+def search_vector(vec, k=8, ids=None, exclude=None):
+    """Top-k scenes for vec; ids restricts the search to those scene ids."""
+    Q = _normalize(np.array(vec, dtype="float32", ndmin=2))
+    if ids is not None:
+        D, labels = vector_store.search_ids(scenes_index, vectors, Q, ids, k)
+    else:
+        params = vector_store.exclude_params(exclude)
+        D, labels = vector_store.search(scenes_index, vectors, Q, k, params=params)
+    return labels[0].tolist(), D[0].tolist()
+
+
+def backfill():
+    """Build scenes for live videos ingested before the scene level existed."""
+    shot_meta, subs_meta = load_all(), subs_index.load_meta_all()
+    by_video = {}
+    for i, m in enumerate(shot_meta):
+        by_video.setdefault(m["video_id"], ([], []))[0].append((i, m))
+    for cid, occ in load_duplicates().items():
+        for m in occ:
+            by_video.setdefault(m["video_id"], ([], []))[0].append((cid, m))
+    for i, m in enumerate(subs_meta):
+        by_video.setdefault(m["video_id"], ([], []))[1].append((i, m))
+
+    built = 0
+    for video_id, (shots, subs) in by_video.items():
+        if id_ranges.get_ranges("scenes", video_id):
+            continue
+        shots = sorted(
+            (s for s in shots if catalog.is_live(s[1])), key=lambda s: s[1]["start"]
+        )
+        subs = [s for s in subs if catalog.is_live(s[1])]
+        entry = catalog.get(video_id) or {}
+        if build(video_id, entry.get("ingest_id"), shots, subs):
+            built += 1
+    save_index()
+    return built
+
+
+if __name__ == "__main__":
+    # Usage: python scenes_index.py build   (run from app/, API stopped)
+    if sys.argv[1:] != ["build"]:
+        sys.exit("usage: python scenes_index.py build")
+    img_index.load_index()
+    subs_index.load_index()
+    load_index()
+    print(f"Built scenes for {backfill()} videos")
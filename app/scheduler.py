@@ -0,0 +1,190 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import serving
+from metrics import RECENT_SECONDS, SEARCH
+
+CORES = os.cpu_count() or 4
+
+
+def _threads(stage, default):
+    return max(1, int(os.environ.get(f"IVS_{stage.upper()}_THREADS", default)))
+
+
+# Threads each ingestion stage may use (IVS_DECODE_THREADS, IVS_CLIP_THREADS,
+# ...), instead of every library sizing its own pool to all cores
+THREADS = {
+    "decode": _threads("decode", CORES // 4),  # ffmpeg, OpenCV shot detection
+    "clip": _threads("clip", CORES // 2),  # torch
+    "asr": _threads("asr", CORES // 4),  # faster-whisper (CTranslate2)
+    "index": _threads("index", CORES // 4),  # FAISS, writer process only
+}
+# Shots in flight between two stages; a full queue blocks the stage before it
+QUEUE_SIZE = int(os.environ.get("IVS_INGEST_QUEUE", "4"))
+
+# "balanced", or "search-priority": before each shot (and before ASR), wait
+# while search p99 over the last minute is above SEARCH_P99_TARGET
+MODE = os.environ.get("IVS_INGEST_MODE", "balanced")
+SEARCH_P99_TARGET = float(os.environ.get("IVS_SEARCH_P99_MS", "250")) / 1000
+THROTTLE_POLL = 0.25
+THROTTLE_MAX = float(os.environ.get("IVS_THROTTLE_MAX_S", "30"))  # per wait
+
+# Search-only workers (IVS_ROLE=reader) report their p99 here for the writer
+LATENCY_DIR = os.path.join("../data", "search_latency")
+LATENCY_REPORT_SECONDS = 5
+
+# One ingest at a time writes the indexes and catalogue: a batch
+# process_video and followed recordings may run concurrently
+INGEST_LOCK = threading.Lock()
+
+_applied = False
+_reported = 0.0
+
+
+def apply_budgets():
+    """Size the thread pools of the libraries ingestion uses (once)."""
+    global _applied
+    if _applied:
+        return
+    _applied = True
+    try:
+        import cv2
+
+        cv2.setNumThreads(THREADS["decode"])
+    except ImportError:
+        pass
+    if serving.ROLE != "writer":
+        # Elsewhere torch and FAISS threads are shared with search (query
+        # embedding, index scans), so leave them be
+        return
+    try:
+        import torch
+
+        torch.set_num_threads(THREADS["clip"])
+    except ImportError:
+        pass
+    import faiss
+
+    faiss.omp_set_num_threads(THREADS["index"])
+
+
+def report_search_latency():
+    """Reader: publish this worker's recent search p99 (every few seconds)."""
+    global _reported
+    now = time.time()
+    if serving.ROLE != "reader" or now - _reported < LATENCY_REPORT_SECONDS:
+        return
+    _reported = now
+    os.makedirs(LATENCY_DIR, exist_ok=True)
+    path = os.path.join(LATENCY_DIR, f"{os.getpid()}.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump({"p99": SEARCH.recent_quantile("total", 0.99), "at": now}, f)
+    os.replace(path + ".tmp", path)
+
+
+def search_p99():
+    """Worst recent search p99 of this process and reporting workers, or None."""
+    values = [SEARCH.recent_quantile("total", 0.99)]
+    if os.path.isdir(LATENCY_DIR):
+        cutoff = time.time() - RECENT_SECONDS
+        for name in os.listdir(LATENCY_DIR):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(LATENCY_DIR, name)) as f:
+                    report = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if report.get("at", 0) >= cutoff:
+                values.append(report.get("p99"))
+    return max((v for v in values if v is not None), default=None)
+
+
+def throttle():
+    """Wait (up to THROTTLE_MAX) while search is slower than its target."""
+    waited = 0.0
+    while waited < THROTTLE_MAX:
+        p99 = search_p99()
+        if p99 is None or p99 <= SEARCH_P99_TARGET:
+            break
+        time.sleep(THROTTLE_POLL)
+        waited += THROTTLE_POLL
+    return waited
+
+
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+def pipeline(items, stages, maxsize=QUEUE_SIZE):
+    """
+    Run items through stages (functions), one thread per stage, connected by
+    bounded queues: a slow stage blocks the ones before it (backpressure)
+    instead of letting their output pile up in RAM. Yields the last stage's
+    results in input order; an exception in any stage is re-raised here.
+    """
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize) for _ in range(len(stages) + 1)]
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def feed():
+        for item in items:
+            if not put(queues[0], item):
+                return
+        put(queues[0], _DONE)
+
+    def work(fn, q_in, q_out):
+        while True:
+            item = get(q_in)
+            if item is _DONE or isinstance(item, _Failed):
+                put(q_out, item)
+                return
+            try:
+                result = fn(item)
+            except Exception as e:
+                put(q_out, _Failed(e))
+                return
+            if not put(q_out, result):
+                return
+
+    threads = [threading.Thread(target=feed, daemon=True)] + [
+        threading.Thread(target=work, args=(fn, queues[n], queues[n + 1]), daemon=True)
+        for n, fn in enumerate(stages)
+    ]
+    for t in threads:
+        t.start()
+    try:
+        while True:
+            item = get(queues[-1])
+            if item is _DONE:
+                return
+            if isinstance(item, _Failed):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
@@ -0,0 +1,98 @@
+import os
+import shutil
+import threading
+import time
+
+import faiss
+
+# Process roles (IVS_ROLE), see run_multi.sh:
+#   "all"    = one process that ingests and searches (default, run.sh)
+#   "writer" = the only process that ingests; publishes index generations
+#   "reader" = search-only worker; maps the latest generation read-only
+ROLE = os.environ.get("IVS_ROLE", "all")
+GENERATION_PATH = os.path.join("../data", "GENERATION")
+GENERATIONS_DIR = os.path.join("../data", "generations")
+KEEP_GENERATIONS = 3  # older generation dirs are deleted on publish
+RELOAD_CHECK_SECONDS = float(os.environ.get("IVS_RELOAD_CHECK_S", "1.0"))
+
+# Map index codes from the page cache instead of reading them into each
+# worker's heap, so N readers share one copy of the index in RAM
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | (
+    faiss.IO_FLAG_READ_ONLY
+)
+
+_lock = threading.Lock()
+_loaded = None
+_checked = 0.0
+
+
+def current_generation():
+    try:
+        with open(GENERATION_PATH) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def generation_dir(gen):
+    return os.path.join(GENERATIONS_DIR, str(gen))
+
+
+def read_index_mmap(path):
+    return faiss.read_index(path, MMAP_FLAGS)
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def publish(index_paths):
+    """
+    Writer: snapshot the saved index files as a new generation, then bump
+    the GENERATION counter. Index files are replaced atomically on save, so
+    hard links are enough to freeze them. Returns the new generation.
+    """
+    gen = current_generation() + 1
+    out_dir = generation_dir(gen)
+    os.makedirs(out_dir, exist_ok=True)
+    for path in index_paths:
+        if os.path.exists(path):
+            _link_or_copy(path, os.path.join(out_dir, os.path.basename(path)))
+
+    tmp = GENERATION_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(str(gen))
+    os.replace(tmp, GENERATION_PATH)
+
+    # Readers still mapping an old generation keep their (unlinked) files
+    for name in os.listdir(GENERATIONS_DIR):
+        if name.isdigit() and int(name) <= gen - KEEP_GENERATIONS:
+            shutil.rmtree(generation_dir(int(name)), ignore_errors=True)
+    return gen
+
+
+def maybe_reload(load, force=False):
+    """
+    Reader: call load(generation_dir) when the writer has committed a new
+    generation. Checks the counter at most every RELOAD_CHECK_SECONDS.
+    """
+    global _loaded, _checked
+    if ROLE != "reader":
+        return
+    now = time.monotonic()
+    if not force and now - _checked < RELOAD_CHECK_SECONDS:
+        return
+    with _lock:
+        _checked = now
+        gen = current_generation()
+        if gen > 0 and gen != _loaded:
+            load(generation_dir(gen))
+            print(f"🔄 Loaded index generation {gen}")
+            _loaded = gen
+
+
+def loaded_generation():
+    return _loaded
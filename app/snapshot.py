@@ -0,0 +1,310 @@
+"""
+Export / import the whole search corpus as one portable snapshot. Run from app/:
+
+    python snapshot.py export ../snapshots/2025-10-20
+    python snapshot.py import ../snapshots/2025-10-20 [--replace] [--force]
+
+A snapshot is a directory of Arrow IPC files (memory-mappable, one row per
+FAISS id, vectors in a fixed-size-list column), the small JSON state files
+copied as-is, and manifest.json with sha256 checksums and the model versions
+the vectors were made with. Import verifies both, then streams record
+batches into the vector files and bulk-loads FAISS in chunks, so peak RAM
+stays near the size of the index itself. Thumbnails and videos are not
+included: copy ../data/thumbs* and the videos alongside. Scenes are not
+included either: rebuild them with `python scenes_index.py build`.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import catalog
+import faiss
+import id_ranges
+import index as img_index
+import numpy as np
+import pyarrow as pa
+import scenes_index
+import store
+import subs_index
+import vector_store
+from frame_store import frames as frame_store
+
+FORMAT = "ivs-snapshot"
+VERSION = 1
+DIM = vector_store.DIM
+BATCH_ROWS = 65536  # rows per Arrow record batch (128 MB of float32 vectors)
+
+MANIFEST = "manifest.json"
+SHOTS_FILE = "shots.arrow"
+SUBS_FILE = "subs.arrow"
+# Small state files copied verbatim: {snapshot name: path in ../data}
+STATE_FILES = {
+    "shots_dupes.jsonl": store.DUPES_PATH,
+    "catalog.json": catalog.CATALOG_PATH,
+    "id_ranges.json": id_ranges.RANGES_PATH,
+}
+
+SHOTS_SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("vector", pa.list_(pa.float32(), DIM)),
+        ("frames", pa.binary()),  # float16 (n_frames, DIM), may be empty
+        ("meta", pa.string()),
+    ]
+)
+SUBS_SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("vector", pa.list_(pa.float32(), DIM)),
+        ("meta", pa.string()),
+    ]
+)
+
+
+def _meta_lines(path):
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield line.rstrip("\n")
+
+
+def _batches(vectors, meta_path, name):
+    """(first_id, vectors, meta lines) per BATCH_ROWS, read lazily."""
+    X = vectors.view()
+    lines = _meta_lines(meta_path)
+    for lo in range(0, len(X), BATCH_ROWS):
+        chunk = X[lo : lo + BATCH_ROWS]
+        metas = [line for _, line in zip(range(len(chunk)), lines)]
+        if len(metas) != len(chunk):
+            sys.exit(f"{name}: {len(X)} vectors but fewer metadata rows")
+        yield lo, chunk, metas
+    if next(lines, None) is not None:
+        sys.exit(f"{name}: more metadata rows than vectors")
+
+
+def _vector_column(X):
+    X = np.ascontiguousarray(X, dtype="float32")
+    return pa.FixedSizeListArray.from_arrays(pa.array(X.ravel()), DIM)
+
+
+def _frame_column(lo, n):
+    table, F = frame_store.table(), frame_store.frames()
+    out = []
+    for i in range(lo, lo + n):
+        if i < len(table) and table[i, 1] > 0:
+            first, count = table[i]
+            out.append(F[first : first + count].tobytes())
+        else:
+            out.append(b"")
+    return pa.array(out, type=pa.binary())
+
+
+def _write_table(path, schema, batches, with_frames=False):
+    rows = 0
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for lo, X, metas in batches:
+            columns = [
+                pa.array(np.arange(lo, lo + len(X), dtype="int64")),
+                _vector_column(X),
+            ]
+            if with_frames:
+                columns.append(_frame_column(lo, len(X)))
+            columns.append(pa.array(metas, type=pa.string()))
+            writer.write_batch(pa.record_batch(columns, schema=schema))
+            rows += len(X)
+    return rows
+
+
+def _file_info(path):
+    return {"sha256": catalog.content_hash(path), "bytes": os.path.getsize(path)}
+
+
+def _model_stamps(entries):
+    stamps = []
+    for entry in entries.values():
+        models = entry.get("models")
+        if models and models not in stamps:
+            stamps.append(models)
+    return stamps
+
+
+def export(out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    img_index.load_index()  # backfills the vector file of older flat indexes
+    subs_index.load_index()
+
+    counts = {
+        "shots": _write_table(
+            os.path.join(out_dir, SHOTS_FILE),
+            SHOTS_SCHEMA,
+            _batches(img_index.vectors, store.META_PATH, "shots"),
+            with_frames=True,
+        ),
+        "subs": _write_table(
+            os.path.join(out_dir, SUBS_FILE),
+            SUBS_SCHEMA,
+            _batches(subs_index.vectors, subs_index.META_PATH, "subs"),
+        ),
+    }
+    files = [SHOTS_FILE, SUBS_FILE]
+    for name, path in STATE_FILES.items():
+        if os.path.exists(path):
+            with (
+                open(path, "rb") as src,
+                open(os.path.join(out_dir, name), "wb") as dst,
+            ):
+                dst.write(src.read())
+            files.append(name)
+
+    manifest = {
+        "format": FORMAT,
+        "version": VERSION,
+        "created_at": catalog.now(),
+        "dim": DIM,
+        "index_mode": vector_store.INDEX_MODE,
+        "models": _model_stamps(catalog.load_all()),
+        "counts": counts,
+        "files": {name: _file_info(os.path.join(out_dir, name)) for name in files},
+    }
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=1)
+    print(
+        f"Exported {counts['shots']} shots, {counts['subs']} subtitle segments to {out_dir}"
+    )
+    return manifest
+
+
+def verify(snap_dir, check_models=True):
+    """Load the manifest and check file checksums (and model versions)."""
+    with open(os.path.join(snap_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT or manifest.get("version") != VERSION:
+        sys.exit(f"Not a version {VERSION} {FORMAT}: {snap_dir}")
+    if manifest["dim"] != DIM:
+        sys.exit(f"Snapshot vectors are {manifest['dim']}-d, this build uses {DIM}")
+    for name, info in manifest["files"].items():
+        if _file_info(os.path.join(snap_dir, name)) != info:
+            sys.exit(f"Checksum mismatch: {name}")
+
+    if check_models:
+        from asr import MODEL_SIZE as ASR_MODEL
+        from models import IMG_MODEL, TEXT_MODEL
+
+        current = {"image": IMG_MODEL, "text": TEXT_MODEL, "asr": ASR_MODEL}
+        for stamp in manifest["models"]:
+            if stamp != current:
+                sys.exit(
+                    f"Snapshot was embedded with {stamp}, this build uses {current}"
+                    " (--force to import anyway)"
+                )
+    return manifest
+
+
+def _data_paths():
+    return [
+        img_index.INDEX_PATH,
+        img_index.VECTORS_PATH,
+        store.META_PATH,
+        subs_index.INDEX_PATH,
+        subs_index.VECTORS_PATH,
+        subs_index.META_PATH,
+        frame_store.frames_path,
+        frame_store.table_path,
+        scenes_index.INDEX_PATH,
+        scenes_index.META_PATH,
+        scenes_index.VECTORS_PATH,
+        scenes_index.VIDEOS_META_PATH,
+        scenes_index.VIDEOS_VECTORS_PATH,
+        *STATE_FILES.values(),
+    ]
+
+
+def _load_table(path, vectors, meta_path, index_path, with_frames=False):
+    """Stream record batches from the memory-mapped file into the data dir."""
+    rows = 0
+    with pa.memory_map(path) as source, open(meta_path, "w") as meta_out:
+        reader = pa.ipc.open_file(source)
+        for b in range(reader.num_record_batches):
+            batch = reader.get_batch(b)
+            ids = batch.column("id").to_numpy()
+            if len(ids) and (ids[0] != rows or ids[-1] != rows + len(ids) - 1):
+                sys.exit(f"{path}: ids are not contiguous at row {rows}")
+            # Zero-copy view of the mapped file; written straight back out
+            X = batch.column("vector").flatten().to_numpy().reshape(-1, DIM)
+            vectors.append(X)
+            if with_frames:
+                frame_store.add_shots(
+                    rows,
+                    [
+                        np.frombuffer(f, dtype="float16").reshape(-1, DIM)
+                        for f in batch.column("frames").to_pylist()
+                    ],
+                )
+            for line in batch.column("meta").to_pylist():
+                meta_out.write(line + "\n")
+            rows += len(ids)
+
+    # Bulk load in chunks from the vector file (PQ trains on a sample)
+    idx = vector_store.rebuild(vectors)
+    faiss.write_index(idx, index_path)
+    return rows
+
+
+def load(snap_dir, replace=False, force=False):
+    manifest = verify(snap_dir, check_models=not force)
+    existing = [p for p in _data_paths() if os.path.exists(p)]
+    if existing and not replace:
+        sys.exit(
+            f"{len(existing)} index files already in ../data (--replace to overwrite)"
+        )
+    for p in existing:
+        os.remove(p)
+    os.makedirs("../data", exist_ok=True)
+
+    shots = _load_table(
+        os.path.join(snap_dir, SHOTS_FILE),
+        img_index.vectors,
+        store.META_PATH,
+        img_index.INDEX_PATH,
+        with_frames=True,
+    )
+    subs = _load_table(
+        os.path.join(snap_dir, SUBS_FILE),
+        subs_index.vectors,
+        subs_index.META_PATH,
+        subs_index.INDEX_PATH,
+    )
+    for name, path in STATE_FILES.items():
+        if name in manifest["files"]:
+            with (
+                open(os.path.join(snap_dir, name), "rb") as src,
+                open(path, "wb") as dst,
+            ):
+                dst.write(src.read())
+    # Scenes are not in snapshots: rebuild them with `python scenes_index.py build`
+    for kind in ("scenes", "videos"):
+        id_ranges.reset(kind)
+    print(f"Imported {shots} shots, {subs} subtitle segments from {snap_dir}")
+    return {"shots": shots, "subs": subs}
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("what", choices=["export", "import"])
+    p.add_argument("dir", help="snapshot directory")
+    p.add_argument("--replace", action="store_true", help="overwrite existing data")
+    p.add_argument("--force", action="store_true", help="skip the model check")
+    args = p.parse_args(argv)
+
+    if args.what == "export":
+        export(args.dir)
+    else:
+        load(args.dir, replace=args.replace, force=args.force)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
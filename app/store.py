@@ -2,6 +2,8 @@ import json
 import os
 
 META_PATH = os.path.join("../data", "shots_meta.jsonl")
+# Shots whose vector was a near-duplicate of an indexed one ("canonical_id")
+DUPES_PATH = os.path.join("../data", "shots_dupes.jsonl")
 
 
 def append(meta: dict):
@@ -10,8 +12,61 @@ def append(meta: dict):
         f.write(json.dumps(meta) + "\n")
 
 
-def load_all():
-    if not os.path.exists(META_PATH):
+_cache = {}  # path → (size, mtime, last line, rows)
+_dupes = (None, {})  # (rows, {canonical_id: [meta, ...]})
+
+
+def read_jsonl(path):
+    """
+    Rows of a metadata JSONL file, parsed once and cached. The files are
+    append-only, so when one has grown only the new lines are parsed (after
+    checking the last line read is still in place); a replaced or truncated
+    file is read again. The list is shared between callers: don't modify it.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        _cache.pop(path, None)
         return []
-    with open(META_PATH) as f:
-        return [json.loads(line) for line in f]
+    size, mtime, tail, rows = _cache.get(path, (0, None, b"", []))
+    if (size, mtime) == (st.st_size, st.st_mtime_ns):
+        return rows
+    with open(path, "rb") as f:
+        if st.st_size >= size:
+            f.seek(size - len(tail))
+            data = f.read(st.st_size - size + len(tail))
+        if st.st_size < size or not data.startswith(tail):
+            size, tail, rows = 0, b"", []
+            f.seek(0)
+            data = f.read(st.st_size)
+    data = data[len(tail) :]
+    # A line still being appended (no newline yet) is read next time
+    end = data.rfind(b"\n") + 1
+    lines = data[:end].splitlines(keepends=True)
+    if lines:
+        rows = rows + [json.loads(line) for line in lines]
+        tail = lines[-1]
+    _cache[path] = (size + end, st.st_mtime_ns, tail, rows)
+    return rows
+
+
+def load_all():
+    return read_jsonl(META_PATH)
+
+
+def append_duplicate(meta: dict):
+    os.makedirs(os.path.dirname(DUPES_PATH), exist_ok=True)
+    with open(DUPES_PATH, "a") as f:
+        f.write(json.dumps(meta) + "\n")
+
+
+def load_duplicates():
+    """Returns {canonical_id: [meta, ...]} for all deduplicated shots."""
+    global _dupes
+    rows = read_jsonl(DUPES_PATH)
+    if rows is not _dupes[0]:
+        dupes = {}
+        for m in rows:
+            dupes.setdefault(m["canonical_id"], []).append(m)
+        _dupes = (rows, dupes)
+    return _dupes[1]
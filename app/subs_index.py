@@ -3,12 +3,17 @@ import os
 
 import faiss
 import numpy as np
+import serving
+import vector_store
+from store import read_jsonl
 
-DIM = 512
+DIM = vector_store.DIM
 INDEX_PATH = os.path.join("../data", "subs.faiss")
 META_PATH = os.path.join("../data", "subs_meta.jsonl")
+VECTORS_PATH = os.path.join("../data", "subs_vectors.f32")
 
-subs_index = faiss.IndexFlatIP(DIM)
+subs_index = vector_store.make_index()
+vectors = vector_store.VectorFile(VECTORS_PATH, DIM)
 
 
 def _normalize(X):
@@ -16,35 +21,69 @@ def _normalize(X):
     return X
 
 
-def load_index():
+def load_index(path=INDEX_PATH, read_only=False):
+    """read_only maps a published generation (search-only workers)."""
     global subs_index
-    if os.path.exists(INDEX_PATH):
-        subs_index = faiss.read_index(INDEX_PATH)
+    if not os.path.exists(path):
+        return
+    if read_only:
+        subs_index = serving.read_index_mmap(path)
+    else:
+        subs_index = faiss.read_index(path)
+        vector_store.backfill(subs_index, vectors)
+        converted = vector_store.convert(subs_index, vectors)
+        if converted is not subs_index:
+            subs_index = converted
+            save_index()
 
 
 def save_index():
     """Save the subtitle index to a file."""
     os.makedirs("../data", exist_ok=True)
-    faiss.write_index(subs_index, INDEX_PATH)
+    # Write then rename, so published generations never see a partial file
+    faiss.write_index(subs_index, INDEX_PATH + ".tmp")
+    os.replace(INDEX_PATH + ".tmp", INDEX_PATH)
 
 
-def add_segments(vectors, metas):
-    X = _normalize(np.asarray(vectors, dtype="float32"))
-    subs_index.add(X)
+def add_segments(vectors_in, metas):
+    """Add segment vectors + metadata; returns the range of ids they were given."""
+    global subs_index
+    X = _normalize(np.asarray(vectors_in, dtype="float32"))
+    base = len(vectors)
+    subs_index = vector_store.add(subs_index, vectors, X)
     os.makedirs("../data", exist_ok=True)
     with open(META_PATH, "a") as f:
         for m in metas:
             f.write(json.dumps(m) + "\n")
+    return range(base, base + len(X))
 
 
 def load_meta_all():
-    if not os.path.exists(META_PATH):
-        return []
-    with open(META_PATH) as f:
-        return [json.loads(line) for line in f]
+    return read_jsonl(META_PATH)
+
+
+def search_vectors(vecs, k=8, ids=None, exclude=None):
+    """
+    Batched top-k: returns (distances, indices) arrays, one row per query.
+    ids restricts the search to those ids; exclude skips those ids.
+    """
+    Q = _normalize(np.array(vecs, dtype="float32", ndmin=2))
+    if ids is not None:
+        return vector_store.search_ids(subs_index, vectors, Q, ids, k)
+    params = vector_store.exclude_params(exclude)
+    return vector_store.search(subs_index, vectors, Q, k, params=params)
 
 
-def search_vector(vec, k=8):
-    Q = _normalize(np.asarray([vec], dtype="float32"))
-    distances, indices = subs_index.search(Q, k)
+def search_vector(vec, k=8, ids=None, exclude=None):
+    """Top-k subtitle segments for vec; ids restricts the search to those ids."""
+    distances, indices = search_vectors([vec], k, ids, exclude)
     return indices[0].tolist(), distances[0].tolist()
+
+
+def score_ids(vec, ids):
+    """Exact cosine similarity of vec with each of the given ids (-1 → -inf)."""
+    Q = np.array(vec, dtype="float32", ndmin=2)
+    faiss.normalize_L2(Q)
+    ids = np.asarray(ids, dtype="int64")
+    ids = np.where(ids < len(vectors), ids, -1)
+    return vector_store.exact_scores(vectors, Q, ids[None, :])[0]
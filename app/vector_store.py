@@ -0,0 +1,265 @@
+import os
+import sys
+
+import faiss
+import numpy as np
+
+DIM = 512
+
+# How vectors are held in RAM by the FAISS indexes:
+#   "flat" = raw float32 (2048 bytes/vector, exact)
+#   "fp16" = float16 scalar quantization (1024 bytes/vector)
+#   "pq"   = product quantization, PQ_M bytes/vector
+# Compressed modes re-rank their top candidates exactly against the float32
+# vectors kept on disk in a memory-mapped file.
+INDEX_MODE = os.environ.get("IVS_INDEX_MODE", "flat")
+PQ_M = int(os.environ.get("IVS_PQ_M", "64"))
+PQ_TRAIN_MIN = 10000  # PQ is trained once this many vectors are stored
+PQ_TRAIN_MAX = 100_000  # training sample size cap
+RERANK_FACTOR = 4  # compressed search fetches k * RERANK_FACTOR candidates
+# Filtered searches over at most this many ids score them exactly from the
+# vector file; larger selections (e.g. time-only filters) go through FAISS
+EXACT_SCAN_MAX = int(os.environ.get("IVS_EXACT_SCAN_MAX", "50000"))
+
+
+def make_index(mode=INDEX_MODE, dim=DIM):
+    if mode == "flat":
+        return faiss.IndexFlatIP(dim)
+    if mode == "fp16":
+        return faiss.IndexScalarQuantizer(
+            dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
+        )
+    if mode == "pq":
+        return faiss.IndexPQ(dim, PQ_M, 8, faiss.METRIC_INNER_PRODUCT)
+    raise ValueError(f"Unknown index mode: {mode}")
+
+
+def is_compressed(index):
+    return not isinstance(index, faiss.IndexFlat)
+
+
+def bytes_per_vector(index):
+    return int(index.code_size)
+
+
+class VectorFile:
+    """Append-only float32 matrix on disk, read through np.memmap."""
+
+    def __init__(self, path, dim=DIM):
+        self.path = path
+        self.dim = dim
+        self._mm = None
+        self._mm_rows = -1
+
+    def __len__(self):
+        if not os.path.exists(self.path):
+            return 0
+        return os.path.getsize(self.path) // (self.dim * 4)
+
+    def append(self, X):
+        X = np.ascontiguousarray(X, dtype="float32")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(X.tobytes())
+
+    def view(self):
+        """Read-only (n, dim) view of all stored vectors."""
+        n = len(self)
+        if n == 0:
+            return np.empty((0, self.dim), dtype="float32")
+        if n != self._mm_rows:
+            self._mm = np.memmap(
+                self.path, dtype="float32", mode="r", shape=(n, self.dim)
+            )
+            self._mm_rows = n
+        return self._mm
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._mm, self._mm_rows = None, -1
+
+
+def backfill(index, vectors):
+    """Copy vectors from an exact (flat) index that predates the vector file."""
+    have = len(vectors)
+    if have < index.ntotal and not is_compressed(index):
+        vectors.append(index.reconstruct_n(have, index.ntotal - have))
+
+
+def _train_sample(X):
+    """Evenly spaced rows of X (at most PQ_TRAIN_MAX) as an in-RAM array."""
+    step = max(1, len(X) // PQ_TRAIN_MAX)
+    return np.ascontiguousarray(X[::step][:PQ_TRAIN_MAX])
+
+
+def _add_all(index, X):
+    for lo in range(0, len(X), 65536):
+        index.add(np.ascontiguousarray(X[lo : lo + 65536]))
+
+
+def add(index, vectors, X):
+    """
+    Add normalized vectors to the vector file and the index.
+    Returns the index to use from now on (PQ is trained lazily and rebuilt).
+    """
+    vectors.append(X)
+    if index.is_trained:
+        index.add(X)
+    elif len(vectors) >= PQ_TRAIN_MIN:
+        index.train(_train_sample(vectors.view()))
+        _add_all(index, vectors.view())
+    return index
+
+
+def rebuild(vectors, mode=INDEX_MODE):
+    """Build a fresh index of the given mode from the vector file."""
+    index = make_index(mode, vectors.dim)
+    X = vectors.view()
+    if not index.is_trained:
+        if len(X) < PQ_TRAIN_MIN:
+            return index
+        index.train(_train_sample(X))
+    _add_all(index, X)
+    return index
+
+
+def convert(index, vectors, mode=INDEX_MODE):
+    """
+    index, or a rebuild of it from the vector file when it was saved under
+    another IVS_INDEX_MODE (FAISS loads whatever type was written).
+    """
+    expected = make_index(mode, index.d)
+    same = is_compressed(index) == is_compressed(expected) and (
+        index.code_size == expected.code_size
+    )
+    if same or len(vectors) < index.ntotal:
+        return index
+    print(f"Rebuilding {index.ntotal}-vector index as IVS_INDEX_MODE={mode}")
+    return rebuild(vectors, mode)
+
+
+def exact_scores(vectors, Q, ids):
+    """Exact inner products of each query row with its candidate ids (-1 → -inf)."""
+    X = vectors.view()
+    D = np.full(ids.shape, -np.inf, dtype="float32")
+    for row in range(len(Q)):
+        valid = ids[row] >= 0
+        if valid.any():
+            D[row, valid] = X[ids[row, valid]] @ Q[row]
+    return D
+
+
+def exclude_params(ids):
+    """faiss SearchParameters skipping the given ids, or None if there are none."""
+    if ids is None or len(ids) == 0:
+        return None
+    ids = np.asarray(ids, dtype="int64")
+    return faiss.SearchParameters(sel=faiss.IDSelectorNot(faiss.IDSelectorBatch(ids)))
+
+
+def search(index, vectors, Q, k, params=None):
+    """
+    Search normalized queries Q (n, dim). Returns (distances, indices) like
+    faiss. Compressed indexes are re-ranked exactly against the vector file.
+    """
+    n_vec = len(vectors)
+    if not index.is_trained:
+        # PQ not trained yet: corpus is small, scan the raw vectors
+        X = np.asarray(vectors.view())
+        exact = faiss.IndexFlatIP(vectors.dim)
+        exact.add(X)
+        return exact.search(Q, k, params=params)
+    if not is_compressed(index) or n_vec < index.ntotal:
+        return index.search(Q, k, params=params)
+
+    _, cand = index.search(Q, k * RERANK_FACTOR, params=params)
+    D = exact_scores(vectors, Q, cand)
+    order = np.argsort(-D, axis=1)[:, :k]
+    labels = np.take_along_axis(cand, order, axis=1)
+    D = np.take_along_axis(D, order, axis=1)
+    labels[~np.isfinite(D)] = -1
+    return D, labels
+
+
+def search_ids(index, vectors, Q, ids, k):
+    """
+    Search only the given ids (sorted int64 array). Small subsets are scored
+    exactly straight from the memory map (a contiguous id range is a
+    zero-copy slice); large ones, or an incomplete vector file, go through
+    the index with an IDSelector.
+    """
+    n = len(Q)
+    if len(ids) == 0:
+        return (
+            np.full((n, k), -np.inf, dtype="float32"),
+            np.full((n, k), -1, dtype="int64"),
+        )
+    lo, hi = int(ids[0]), int(ids[-1]) + 1
+    contiguous = hi - lo == len(ids) and bool(np.all(np.diff(ids) > 0))
+    if len(ids) > EXACT_SCAN_MAX or len(vectors) < index.ntotal:
+        if contiguous:
+            sel = faiss.IDSelectorRange(lo, hi)
+        else:
+            sel = faiss.IDSelectorBatch(ids)
+        return search(index, vectors, Q, k, params=faiss.SearchParameters(sel=sel))
+
+    X = vectors.view()
+    sub = X[lo:hi] if contiguous else X[ids]
+    S = np.asarray(Q @ sub.T, dtype="float32")
+    kk = min(k, len(ids))
+    top = np.argpartition(-S, kk - 1, axis=1)[:, :kk]
+    top_s = np.take_along_axis(S, top, axis=1)
+    order = np.argsort(-top_s, axis=1)
+    D = np.full((n, k), -np.inf, dtype="float32")
+    labels = np.full((n, k), -1, dtype="int64")
+    D[:, :kk] = np.take_along_axis(top_s, order, axis=1)
+    labels[:, :kk] = ids[np.take_along_axis(top, order, axis=1)]
+    return D, labels
+
+
+def report(vectors, k=10, n_queries=200, seed=0):
+    """Bytes per vector and recall@k vs exact search, for every index mode."""
+    X = np.asarray(vectors.view())
+    rng = np.random.default_rng(seed)
+    Q = X[rng.choice(len(X), size=min(n_queries, len(X)), replace=False)]
+    Q = Q + rng.normal(scale=0.05, size=Q.shape).astype("float32")
+    faiss.normalize_L2(Q)
+
+    _, truth = search(rebuild(vectors, "flat"), vectors, Q, k)
+    rows = []
+    for mode in ("flat", "fp16", "pq"):
+        index = rebuild(vectors, mode)
+        if index.ntotal == 0:
+            rows.append({"mode": mode, "bytes_per_vector": None, "recall": None})
+            continue
+        _, labels = search(index, vectors, Q, k)
+        hits = sum(
+            len(set(a) & set(b)) for a, b in zip(labels.tolist(), truth.tolist())
+        )
+        rows.append(
+            {
+                "mode": mode,
+                "bytes_per_vector": bytes_per_vector(index),
+                "recall": hits / truth.size,
+            }
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    # Usage: python vector_store.py [k]   (run from app/, after ingesting videos)
+    import index as img_index
+    import subs_index
+
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for name, module in (("shots", img_index), ("subs", subs_index)):
+        module.load_index()
+        if len(module.vectors) == 0:
+            print(f"{name}: no vectors stored")
+            continue
+        print(f"{name}: {len(module.vectors)} vectors, recall@{k}")
+        for row in report(module.vectors, k=k):
+            print(
+                f"  {row['mode']:>4}: {row['bytes_per_vector']} bytes/vector, recall={row['recall']}"
+            )
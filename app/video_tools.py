@@ -4,13 +4,17 @@ import subprocess
 
 from scenedetect import SceneManager, VideoManager
 from scenedetect.detectors import ContentDetector
+from scheduler import THREADS
 
 
-def detect_shots(video_path, threshold=27):
+def detect_shots(video_path, threshold=27, start=0.0):
+    """(start, end) seconds of each shot, detected from `start` on."""
     vm = VideoManager([video_path])
     sm = SceneManager()
     sm.add_detector(ContentDetector(threshold=threshold))
     vm.set_downscale_factor()
+    if start > 0:
+        vm.set_duration(start_time=vm.get_base_timecode() + start)
     vm.start()
     sm.detect_scenes(frame_source=vm)
     shots = sm.get_scene_list()
@@ -19,6 +23,29 @@ def detect_shots(video_path, threshold=27):
     return times
 
 
+def probe_duration(video_path):
+    """Video duration in seconds from ffprobe, or None if it can't be read."""
+    try:
+        out = subprocess.run(
+            [
+                "ffprobe",
+                "-v",
+                "error",
+                "-show_entries",
+                "format=duration",
+                "-of",
+                "default=noprint_wrappers=1:nokey=1",
+                video_path,
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        return float(out.stdout.strip())
+    except (subprocess.CalledProcessError, ValueError, OSError):
+        return None
+
+
 def extract_midframe(video_path, start, end, out_dir="../data/thumbs"):
     """Extract a single frame from the middle of a shot (legacy function)"""
     os.makedirs(out_dir, exist_ok=True)
@@ -40,6 +67,8 @@ def extract_midframe(video_path, start, end, out_dir="../data/thumbs"):
                 [
                     "ffmpeg",
                     "-y",
+                    "-threads",
+                    str(THREADS["decode"]),
                     "-ss",
                     str(extract_time),
                     "-i",
@@ -114,6 +143,8 @@ def extract_multiframes(video_path, start, end, out_dir="../data/thumbs", num_fr
                 [
                     "ffmpeg",
                     "-y",
+                    "-threads",
+                    str(THREADS["decode"]),
                     "-ss",
                     str(extract_time),
                     "-i",
@@ -141,6 +172,8 @@ def extract_multiframes(video_path, start, end, out_dir="../data/thumbs", num_fr
                             [
                                 "ffmpeg",
                                 "-y",
+                                "-threads",
+                                str(THREADS["decode"]),
                                 "-ss",
                                 str(fallback_time),
                                 "-i",
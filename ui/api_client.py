@@ -0,0 +1,93 @@
+import socket
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+SEARCH_CACHE_TTL = 600  # seconds a (query, k, alpha, rerank) response is reused
+CATALOG_CACHE_TTL = 30  # seconds the processed-videos catalogue is reused
+
+
+@st.cache_resource
+def detect_environment():
+    """
+    Detect if running on Mac or Nebius VM based on hostname/IP.
+    Cached for the life of the Streamlit server, so the probing socket is
+    opened once instead of on every script rerun.
+    """
+    try:
+        hostname = socket.gethostname()
+
+        # Are we on Nebius VM?
+        if "computeinstance" in hostname.lower():
+            return "nebius"
+
+        # Check if we can reach the Nebius internal IP
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.settimeout(1)
+        result = test_socket.connect_ex(("10.96.0.49", 8000))
+        test_socket.close()
+
+        if result == 0:  # Connection successful
+            return "nebius"
+        else:
+            return "mac"
+
+    except Exception:
+        return "mac"
+
+
+@st.cache_resource
+def get_session():
+    """One pooled keep-alive HTTP session shared by all reruns and users."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(total=2, backoff_factor=0.2, allowed_methods=["GET"]),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_data(ttl=SEARCH_CACHE_TTL, show_spinner="Searching...")
+def search(api, query, k, alpha, rerank=False):
+    """POST /search, cached by (api, query, k, alpha, rerank)."""
+    r = get_session().post(
+        f"{api}/search",
+        data={"query": query, "k": k, "alpha": alpha, "rerank": rerank},
+        timeout=60,
+    )
+    r.raise_for_status()
+    return r.json()
+
+
+@st.cache_data(ttl=CATALOG_CACHE_TTL, show_spinner=False)
+def get_catalog(api):
+    """GET /catalog: {video_id: entry} for every processed video."""
+    r = get_session().get(f"{api}/catalog", timeout=10)
+    r.raise_for_status()
+    return r.json()
+
+
+def process_video(api, video_path, video_id, shot_threshold, force=False):
+    """POST /process_video; new data invalidates cached responses."""
+    r = get_session().post(
+        f"{api}/process_video",
+        data={
+            "video_path": video_path,
+            "video_id": video_id,
+            "shot_threshold": shot_threshold,
+            "force": force,
+        },
+    )
+    if r.status_code == 200:
+        clear_cache()
+    return r
+
+
+def clear_cache():
+    search.clear()
+    get_catalog.clear()
@@ -1,8 +1,7 @@
 import glob
 import os
-import socket
 
-import requests
+import api_client
 import streamlit as st
 
 
@@ -10,32 +9,14 @@ def join_url(base, *parts):
     return "/".join([base.rstrip("/")] + [p.strip("/") for p in parts])
 
 
-def detect_environment():
-    """Detect if running on Mac or Nebius VM based on hostname/IP"""
-    try:
-        hostname = socket.gethostname()
-
-        # Are we on Nebius VM?
-        if "computeinstance" in hostname.lower():
-            return "nebius"
-
-        # Check if we can reach the Nebius internal IP
-        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        test_socket.settimeout(1)
-        result = test_socket.connect_ex(("10.96.0.49", 8000))
-        test_socket.close()
-
-        if result == 0:  # Connection successful
-            return "nebius"
-        else:
-            return "mac"
-
-    except Exception:
-        return "mac"
+def format_timestamp(seconds):
+    minutes = int(seconds // 60)
+    secs = int(seconds % 60)
+    return f"{minutes:02d}:{secs:02d}"
 
 
 # Set API configuration based on environment
-ENVIRONMENT = detect_environment()
+ENVIRONMENT = api_client.detect_environment()
 
 if ENVIRONMENT == "nebius":
     # Nebius VM configuration
@@ -45,9 +26,13 @@ if ENVIRONMENT == "nebius":
 else:
     # Mac configuration
     API = "http://localhost:8000"  # Local dev hits FastAPI directly
-    THUMBNAIL_BASE = "http://localhost:8000/static"  # Local thumbnails
+    # FastAPI /media: ETag/Cache-Control headers + Range requests for seeking
+    THUMBNAIL_BASE = "http://localhost:8000/media"  # Local thumbnails
     ENV_LABEL = "💻 Mac"
 
+# With run_multi.sh, ingestion goes to the single index writer process
+INGEST_API = os.environ.get("IVS_INGEST_API", API)
+
 st.title("In-Video Search")
 st.write("by Raymond Gan, 10/27/2025")
 
@@ -73,57 +58,62 @@ with st.expander("Process a video"):
     video_filename = os.path.basename(vp)
     video_id = os.path.splitext(video_filename)[0]  # Remove .mp4 extension
 
-    # Check if thumbnails already exist for this video
-    thumbs_dir = os.path.expanduser("~/ivs/data/thumbs")
-    # Use the full filename (with .mp4) to match thumbnail naming pattern
-    existing_thumbs = glob.glob(os.path.join(thumbs_dir, f"{video_filename}_*.jpg"))
-    already_processed = len(existing_thumbs) > 0
+    # Look the video up in the backend's catalogue of processed videos
+    try:
+        entry = api_client.get_catalog(API).get(video_id)
+    except Exception:
+        entry = None
+    already_processed = entry is not None
 
     if already_processed:
         st.success(
-            f"✅ {video_id} already processed ({len(existing_thumbs)} thumbnails found)"
+            f"✅ {video_id} already processed ({entry.get('shots', 0)} shots, "
+            f"{entry.get('subtitle_segments', 0)} subtitle segments)"
         )
         st.info(
-            "💡 To reprocess, delete existing thumbnails in Data Management section below"
+            "💡 Processing again is skipped unless the video or threshold changed. "
+            "Tick Force reprocess to redo it anyway."
         )
-    else:
-        st.write("**Shot Detection Threshold:**")
-        st.caption("20-25 = Very Sensitive (many short shots)")
-        st.caption("26-30 = Balanced (1 new shot every few seconds)")
-        st.caption("31-35 = Less Sensitive (fewer, longer shots)")
-        thr = st.slider("Threshold", 20, 40, 27, label_visibility="collapsed")
-
-        if st.button("Process"):
-            r = requests.post(
-                f"{API}/process_video",
-                data={"video_path": vp, "video_id": video_id, "shot_threshold": thr},
-            )
-            if r.status_code == 200:
-                try:
-                    result = r.json()
+
+    st.write("**Shot Detection Threshold:**")
+    st.caption("20-25 = Very Sensitive (many short shots)")
+    st.caption("26-30 = Balanced (1 new shot every few seconds)")
+    st.caption("31-35 = Less Sensitive (fewer, longer shots)")
+    thr = st.slider("Threshold", 20, 40, 27, label_visibility="collapsed")
+
+    force = already_processed and st.checkbox(
+        "Force reprocess",
+        help="Reprocess even if the video and threshold are unchanged",
+    )
+    if st.button("Process"):
+        r = api_client.process_video(INGEST_API, vp, video_id, thr, force=force)
+        if r.status_code == 200:
+            try:
+                result = r.json()
+                if result.get("skipped"):
+                    st.info(f"⏭️ {video_id} unchanged, skipped processing")
+                else:
                     st.success(f"✅ Processing complete!")
-                    st.write(f"**Shots detected:** {result.get('shots', 0)}")
-                    st.write(
-                        f"**Frames processed:** {result.get('total_frames_processed', 0)} (3 per shot)"
-                    )
-                    st.write(
-                        f"**Subtitle segments:** {result.get('subtitle_segments', 0)}"
-                    )
-
-                    # Display processing time
-                    processing_time = result.get("processing_time_seconds", 0)
-                    if processing_time > 0:
-                        minutes = int(processing_time // 60)
-                        seconds = processing_time % 60
-                        if minutes > 0:
-                            st.write(f"**Processing time:** {minutes}m {seconds:.1f}s")
-                        else:
-                            st.write(f"**Processing time:** {seconds:.1f}s")
-                except Exception:
-                    st.error("Could not parse response")
-            else:
-                st.error(f"❌ Processing failed (Status: {r.status_code})")
-                st.write(f"Error: {r.text}")
+                st.write(f"**Shots detected:** {result.get('shots', 0)}")
+                st.write(
+                    f"**Frames processed:** {result.get('total_frames_processed', 0)} (3 per shot)"
+                )
+                st.write(f"**Subtitle segments:** {result.get('subtitle_segments', 0)}")
+
+                # Display processing time
+                processing_time = result.get("processing_time_seconds", 0)
+                if processing_time > 0:
+                    minutes = int(processing_time // 60)
+                    seconds = processing_time % 60
+                    if minutes > 0:
+                        st.write(f"**Processing time:** {minutes}m {seconds:.1f}s")
+                    else:
+                        st.write(f"**Processing time:** {seconds:.1f}s")
+            except Exception:
+                st.error("Could not parse response")
+        else:
+            st.error(f"❌ Processing failed (Status: {r.status_code})")
+            st.write(f"Error: {r.text}")
 
 # Predefined search examples
 search_examples = [
@@ -164,6 +154,11 @@ with col1:
     st.caption("Lower = Fewer, better search results")
     st.caption("Higher = More, poorer search results")
     k = st.slider("Number of results", 1, 20, 8, label_visibility="collapsed")
+    rerank = st.checkbox(
+        "Re-rank top 100 candidates",
+        help="Slower, more precise: re-scores a wide candidate set by its best "
+        "frame, neighbouring shots and keyword matches",
+    )
 
 with col2:
     st.write("**Search Importance (Images vs Dialogue):**")
@@ -173,133 +168,138 @@ with col2:
 
     alpha = st.slider("Alpha", 0.0, 1.0, 0.6, 0.1, label_visibility="collapsed")
 
-if st.button("Search"):
-    r = requests.post(
-        f"{API}/search", data={"query": query, "k": k, "alpha": alpha}
-    ).json()
-    if not r.get("results"):
-        st.info("No results yet. Make sure you processed at least one video.")
-    for item in r.get("results", []):
-
-        def format_timestamp(seconds):
-            minutes = int(seconds // 60)
-            secs = int(seconds % 60)
-            return f"{minutes:02d}:{secs:02d}"
-
-        # Create video player with timestamp
-        video_path = item.get("video_path", f"~/ivs/data/videos/{item['video_id']}.mp4")
-        expanded_path = os.path.expanduser(video_path)
-
-        # Convert absolute path to relative path under ~/ivs/data/
-        if expanded_path.startswith(os.path.expanduser("~/ivs/data/")):
-            relative_path = expanded_path.replace(os.path.expanduser("~/ivs/data/"), "")
-            # Works on both envs:
-            #  - Nebius: https://.../data/<videos/...>
-            #  - Mac:    http://localhost:8000/static/<videos/...>
-            video_url = join_url(THUMBNAIL_BASE, relative_path)
-        else:
-            video_url = f"file://{expanded_path}"
+PAGE_SIZE = 5  # results rendered per page
+RESULT_THUMB_WIDTH = 320  # px, thumbnails in the result list
+EXACT_THUMB_WIDTH = 640  # px, thumbnail under an exact match's player
+
+
+def media_url(url):
+    """
+    Backend returns /static/... or /media/... paths, but THUMBNAIL_BASE
+    already includes that prefix.
+    Mac: THUMBNAIL_BASE = "http://localhost:8000/media", need "thumbs/..."
+    Nebius: THUMBNAIL_BASE = "https://raymond.hopto.org/data", need "thumbs/..."
+    """
+    path = url.lstrip("/")
+    for prefix in ("static/", "media/"):
+        if path.startswith(prefix):
+            path = path[len(prefix) :]
+    return join_url(THUMBNAIL_BASE, path)
+
+
+def video_url_for(item):
+    video_path = item.get("video_path", f"~/ivs/data/videos/{item['video_id']}.mp4")
+    expanded_path = os.path.expanduser(video_path)
+
+    # Convert absolute path to relative path under ~/ivs/data/
+    if expanded_path.startswith(os.path.expanduser("~/ivs/data/")):
+        relative_path = expanded_path.replace(os.path.expanduser("~/ivs/data/"), "")
+        # Works on both envs:
+        #  - Nebius: https://.../data/<videos/...>
+        #  - Mac:    http://localhost:8000/media/<videos/...>
+        return join_url(THUMBNAIL_BASE, relative_path)
+    return f"file://{expanded_path}"
+
+
+def thumb_url_for(item, width):
+    """Smallest resized thumbnail at least `width` px wide, else the widest."""
+    sized = {int(w): u for w, u in (item.get("thumb_urls") or {}).items()}
+    wide_enough = [w for w in sorted(sized) if w >= width]
+    if wide_enough:
+        url = sized[wide_enough[0]]
+    else:
+        url = sized[max(sized)] if sized else item.get("thumb_url")
+    return media_url(url) if url else None
 
-        # For exact matches, always show video player prominently
-        if item.get("exact_match"):
-            st.write(
-                f"🎯 **EXACT MATCH:** {item['video_id']} [{format_timestamp(item['start'])}–{format_timestamp(item['end'])}]"
-            )
-            st.write(f"**Quote:** \"{item.get('text', '')}\"")
-            st.write(f"**Score:** {item['final']:.3f}")
 
-            # Always show video player for exact matches
-            st.video(video_url, start_time=int(item["start"]))
+def describe(item):
+    span = f"[{format_timestamp(item['start'])}–{format_timestamp(item['end'])}]"
+    subtitle_text = item.get("text", "")
+    if subtitle_text:
+        return (
+            f"{item['video_id']} {span} - {subtitle_text} (score={item['final']:.3f})"
+        )
+    return f"{item['video_id']} {span} score={item['final']:.3f}"
 
-            # Add timestamp and score below video
-            subtitle_text = item.get("text", "")
-            if subtitle_text:
-                st.write(
-                    f"{item['video_id']} [{format_timestamp(item['start'])}–{format_timestamp(item['end'])}] - {subtitle_text} (score={item['final']:.3f})"
-                )
-            else:
-                st.write(
-                    f"{item['video_id']} [{format_timestamp(item['start'])}–{format_timestamp(item['end'])}] score={item['final']:.3f}"
-                )
 
-            # Optionally show thumbnail if available
-            if item.get("thumb_url"):
-                try:
-                    # Backend returns: /static/thumbs/... but THUMBNAIL_BASE already includes the path
-                    # Mac: THUMBNAIL_BASE = "http://localhost:8000/static", need "thumbs/..."
-                    # Nebius: THUMBNAIL_BASE = "https://raymond.hopto.org/data", need "thumbs/..."
-                    thumb_path = item["thumb_url"].lstrip("/")
-                    if thumb_path.startswith("static/"):
-                        thumb_path = thumb_path[7:]  # Remove "static/" prefix
-                    thumb_url = join_url(THUMBNAIL_BASE, thumb_path)
-                    st.image(thumb_url)
-                except Exception:
-                    pass  # Ignore thumbnail errors for exact matches
-        elif item.get("thumb_url"):
-            # Show thumbnail with fallback
-            # Backend returns: /static/thumbs/... but THUMBNAIL_BASE already includes the path
-            # Mac: THUMBNAIL_BASE = "http://localhost:8000/static", need "thumbs/..."
-            # Nebius: THUMBNAIL_BASE = "https://raymond.hopto.org/data", need "thumbs/..."
-            thumb_path = item["thumb_url"].lstrip("/")
-            if thumb_path.startswith("static/"):
-                thumb_path = thumb_path[7:]  # Remove "static/" prefix
-            thumb_url = join_url(THUMBNAIL_BASE, thumb_path)
-            try:
-                st.image(
-                    thumb_url,
-                    caption=f"{item['video_id']}  "
-                    f"[{format_timestamp(item['start'])}–{format_timestamp(item['end'])}]  "
-                    f"score={item['final']:.3f}",
-                )
-                # Add video player with timestamp
-                st.video(video_url, start_time=int(item["start"]))
-
-                # Add timestamp and score below video
-                subtitle_text = item.get("text", "")
-                if subtitle_text:
-                    st.write(
-                        f"{item['video_id']} [{format_timestamp(item['start'])}–{format_timestamp(item['end'])}] - {subtitle_text} (score={item['final']:.3f})"
-                    )
-                else:
-                    st.write(
-                        f"{item['video_id']} [{format_timestamp(item['start'])}–{format_timestamp(item['end'])}] score={item['final']:.3f}"
-                    )
+def render_result(item, key):
+    video_url = video_url_for(item)
 
-            except Exception as e:
-                # If thumbnail fails to load, show text version with debug info
-                st.write(
-                    f"**{item['video_id']}** [{format_timestamp(item['start'])}–{format_timestamp(item['end'])}] - Thumbnail error: {str(e)[:50]}... (score={item['final']:.3f})"
-                )
-                # Add video player with timestamp
-                st.video(video_url, start_time=int(item["start"]))
-
-                # Add timestamp and score below video
-                subtitle_text = item.get("text", "")
-                if subtitle_text:
-                    st.write(
-                        f"{item['video_id']} [{format_timestamp(item['start'])}–{format_timestamp(item['end'])}] - {subtitle_text} (score={item['final']:.3f})"
-                    )
-                else:
-                    st.write(
-                        f"{item['video_id']} [{format_timestamp(item['start'])}–{format_timestamp(item['end'])}] score={item['final']:.3f}"
-                    )
-        else:
-            st.write(
-                f"**{item['video_id']}** [{format_timestamp(item['start'])}–{format_timestamp(item['end'])}] - {item.get('text', '')[:100]}... (score={item['final']:.3f})"
+    # For exact matches, always show video player prominently
+    if item.get("exact_match"):
+        st.write(
+            f"🎯 **EXACT MATCH:** {item['video_id']} [{format_timestamp(item['start'])}–{format_timestamp(item['end'])}]"
+        )
+        st.write(f"**Quote:** \"{item.get('text', '')}\"")
+        st.write(f"**Score:** {item['final']:.3f}")
+        st.video(video_url, start_time=int(item["start"]))
+        st.write(describe(item))
+        thumb_url = thumb_url_for(item, EXACT_THUMB_WIDTH)
+        if thumb_url:
+            st.image(thumb_url)
+        return
+
+    thumb_url = thumb_url_for(item, RESULT_THUMB_WIDTH)
+    if thumb_url:
+        st.image(
+            thumb_url,
+            width=RESULT_THUMB_WIDTH,
+            caption=f"{item['video_id']}  "
+            f"[{format_timestamp(item['start'])}–{format_timestamp(item['end'])}]  "
+            f"score={item['final']:.3f}",
+        )
+    else:
+        st.write(
+            f"**{item['video_id']}** [{format_timestamp(item['start'])}–{format_timestamp(item['end'])}] - {item.get('text', '')[:100]}... (score={item['final']:.3f})"
+        )
+
+    # Video players load lazily: only once the user asks to play this result
+    if st.toggle("▶️ Play", key=f"play_{key}"):
+        st.video(video_url, start_time=int(item["start"]))
+    st.write(describe(item))
+    if item.get("occurrences"):
+        st.caption(
+            "Same shot also in: "
+            + ", ".join(
+                f"{o['video_id']} [{format_timestamp(o['start'])}]"
+                for o in item["occurrences"]
             )
-            # Add video player with timestamp
-            st.video(video_url, start_time=int(item["start"]))
+        )
 
-            # Add timestamp and score below video
-            subtitle_text = item.get("text", "")
-            if subtitle_text:
-                st.write(
-                    f"{item['video_id']} [{format_timestamp(item['start'])}–{format_timestamp(item['end'])}] - {subtitle_text} (score={item['final']:.3f})"
-                )
-            else:
-                st.write(
-                    f"{item['video_id']} [{format_timestamp(item['start'])}–{format_timestamp(item['end'])}] score={item['final']:.3f}"
-                )
+
+if st.button("Search"):
+    try:
+        st.session_state["search_response"] = api_client.search(
+            API, query, k, alpha, rerank
+        )
+        st.session_state["page"] = 0
+    except Exception as e:
+        st.error(f"❌ Search failed: {e}")
+
+# Results survive reruns (slider moves, pagination) without re-posting
+r = st.session_state.get("search_response")
+if r is not None:
+    results = r.get("results", [])
+    if not results:
+        st.info("No results yet. Make sure you processed at least one video.")
+
+    n_pages = max(1, -(-len(results) // PAGE_SIZE))
+    page = min(st.session_state.get("page", 0), n_pages - 1)
+    for n, item in enumerate(results[page * PAGE_SIZE : (page + 1) * PAGE_SIZE]):
+        render_result(item, key=f"{page}_{n}")
+
+    if n_pages > 1:
+        prev_col, info_col, next_col = st.columns([1, 2, 1])
+        with prev_col:
+            if st.button("⬅️ Previous", disabled=page == 0):
+                st.session_state["page"] = page - 1
+                st.rerun()
+        with info_col:
+            st.caption(f"Page {page + 1} of {n_pages} ({len(results)} results)")
+        with next_col:
+            if st.button("Next ➡️", disabled=page >= n_pages - 1):
+                st.session_state["page"] = page + 1
+                st.rerun()
 
 # Data Management Section
 with st.expander("🗑️ Data Management", expanded=False):
@@ -313,8 +313,11 @@ with st.expander("🗑️ Data Management", expanded=False):
             project_dir = os.path.expanduser("~/ivs")
             deleted_files = []
 
-            # Delete all .jpg files in thumbs directory
-            thumb_files = glob.glob(os.path.join(data_dir, "thumbs", "*.jpg"))
+            # Delete all .jpg files in thumbs directory and resized thumbnails
+            # (thumbs_sized/<width>/<ingest id>/)
+            thumb_files = glob.glob(
+                os.path.join(data_dir, "thumbs", "*.jpg")
+            ) + glob.glob(os.path.join(data_dir, "thumbs_sized", "*", "*", "*"))
             for file in thumb_files:
                 try:
                     os.remove(file)
@@ -322,10 +325,24 @@ with st.expander("🗑️ Data Management", expanded=False):
                 except Exception as e:
                     st.error(f"Failed to delete {file}: {e}")
 
-            # Delete all .jsonl and .faiss files in data directory
-            data_files = glob.glob(os.path.join(data_dir, "*.jsonl")) + glob.glob(
-                os.path.join(data_dir, "*.faiss")
-            )
+            # Delete all .jsonl, .json (catalogue, id ranges), .faiss, .f32
+            # (raw vectors) and .f16/.idx (per-frame vectors) files in data
+            # directory, plus index generations and latency reports of search workers
+            data_files = [
+                f
+                for ext in (
+                    "*.jsonl",
+                    "*.json",
+                    "*.faiss",
+                    "*.f32",
+                    "*.f16",
+                    "*.idx",
+                    "GENERATION",
+                    os.path.join("generations", "*", "*"),
+                    os.path.join("search_latency", "*"),
+                )
+                for f in glob.glob(os.path.join(data_dir, ext))
+            ]
             for file in data_files:
                 try:
                     os.remove(file)
@@ -371,6 +388,10 @@ with st.expander("🗑️ Data Management", expanded=False):
                         except Exception as e:
                             st.error(f"Failed to delete {ds_path}: {e}")
 
+            # Cached search responses point at deleted data
+            api_client.clear_cache()
+            st.session_state.pop("search_response", None)
+
             # Report results
             total_deleted = (
                 len(deleted_files)
@@ -412,12 +433,11 @@ with st.expander("🗑️ Data Management", expanded=False):
                 st.info("No files found to delete.")
 
     with col2:
-        st.info(
-            """
+        st.info("""
         **What gets deleted:**
-        - All thumbnail images (*.jpg)
-        - Search indexes (*.faiss)
-        - Metadata files (*.jsonl)
+        - All thumbnail images (*.jpg) and resized thumbnails
+        - Search indexes (*.faiss) and raw vectors (*.f32, *.f16)
+        - Metadata files (*.jsonl) and video catalogue (*.json)
         - Python cache directories (__pycache__)
         - Python bytecode files (*.pyc)
         - System files (.DS_Store)
@@ -428,5 +448,4 @@ with st.expander("🗑️ Data Management", expanded=False):
         - Source code files
         - Virtual environments
         - Running servers (backend/frontend)
-        """
-        )
+        """)